@@ -1,14 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory, url_for
 import os
 import cv2
 import numpy as np
 import moviepy.editor as mp
-from moviepy.video.tools.subtitles import SubtitlesClip
-from moviepy.editor import VideoFileClip, concatenate_videoclips, ImageSequenceClip
+from moviepy.config import get_setting
 import uuid
 import re
-import whisper
-from werkzeug.utils import secure_filename
+import bisect
+import json
+import math
+from fractions import Fraction
+import time
+import hashlib
+import queue
+import shutil
+import sqlite3
+import multiprocessing
+import subprocess
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+import proglog
+from PIL import Image, ImageDraw, ImageFont
 import tempfile
 
 app = Flask(__name__)
@@ -17,27 +29,175 @@ app = Flask(__name__)
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "output"
 TEMP_FOLDER = "temp"
+CACHE_FOLDER = "cache"
+# Resumable uploads in progress: the bytes received so far and the session state
+PARTIAL_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, "partial")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(PARTIAL_UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(TEMP_FOLDER, exist_ok=True)
+os.makedirs(CACHE_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["OUTPUT_FOLDER"] = OUTPUT_FOLDER
 app.config["TEMP_FOLDER"] = TEMP_FOLDER
+app.config["PARTIAL_UPLOAD_FOLDER"] = PARTIAL_UPLOAD_FOLDER
+app.config["CACHE_FOLDER"] = CACHE_FOLDER
 
-# Load Whisper model
-try:
-    stt_model = whisper.load_model("base")
-except Exception as e:
-    stt_model = None
-    print(f"Warning: Whisper model could not be loaded. Auto-captioning will be disabled. Error: {e}")
+# ffmpeg binary resolved by MoviePy (system ffmpeg or the imageio-ffmpeg download)
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
 
-# Load YOLO model for face detection
-try:
+# Start probing, transcription, scene-cut detection and detection indexing of a video as soon as it is uploaded
+app.config["UPLOAD_PREANALYSIS"] = os.environ.get("UPLOAD_PREANALYSIS", "1") == "1"
+
+# Resumable uploads that receive no data for this many seconds are deleted, checked every UPLOAD_CLEANUP_INTERVAL
+app.config["UPLOAD_SESSION_TTL"] = int(os.environ.get("UPLOAD_SESSION_TTL", 24 * 3600))
+UPLOAD_CLEANUP_INTERVAL = 60
+
+# Let a fronting server (nginx X-Accel, Apache mod_xsendfile) send /download files instead of the Flask worker
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "0") == "1"
+
+# Background job queue (SQLite) and the number of jobs processed at once
+JOBS_DB = "jobs.db"
+app.config["JOBS_DB"] = JOBS_DB
+app.config["MAX_CONCURRENT_JOBS"] = int(os.environ.get("MAX_CONCURRENT_JOBS", 2))
+
+# Total size of cached /process_video outputs kept in OUTPUT_FOLDER before LRU eviction
+app.config["RESULT_CACHE_MAX_BYTES"] = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+
+# Maximum number of frames buffered between pipeline stages
+FRAME_QUEUE_SIZE = 32
+
+# Number of frames passed to YOLO in a single inference call
+app.config["DETECTION_BATCH_SIZE"] = int(os.environ.get("DETECTION_BATCH_SIZE", 8))
+
+# Run YOLO on every Nth frame and track the person box with optical flow in between
+app.config["DETECTION_INTERVAL"] = int(os.environ.get("DETECTION_INTERVAL", 8))
+
+# Frames from all running jobs are batched together for YOLO: up to INFERENCE_MAX_BATCH frames
+# per call, waiting at most INFERENCE_MAX_LATENCY_MS for other jobs to fill a batch
+app.config["INFERENCE_MAX_BATCH"] = int(os.environ.get("INFERENCE_MAX_BATCH", 32))
+app.config["INFERENCE_MAX_LATENCY_MS"] = float(os.environ.get("INFERENCE_MAX_LATENCY_MS", 5))
+
+# Split long videos at keyframes and render the pieces in a process pool
+app.config["PARALLEL_RENDER"] = os.environ.get("PARALLEL_RENDER", "0") == "1"
+app.config["CHUNK_WORKERS"] = int(os.environ.get("CHUNK_WORKERS", os.cpu_count() or 1))
+
+# /preview renders the first PREVIEW_SECONDS, fit within PREVIEW_MAX_SIZE pixels, with x264's fastest preset
+app.config["PREVIEW_SECONDS"] = float(os.environ.get("PREVIEW_SECONDS", 5))
+app.config["PREVIEW_MAX_SIZE"] = int(os.environ.get("PREVIEW_MAX_SIZE", 480))
+
+# Render engine: "ffmpeg" runs caption-free resizes and crops as ffmpeg filter graphs,
+# "python" sends every frame through Python (MoviePy / OpenCV)
+app.config["RENDER_ENGINE"] = os.environ.get("RENDER_ENGINE", "ffmpeg")
+
+# Window (in seconds) of the moving average that smooths the crop path of ffmpeg-rendered crops
+CROP_SMOOTHING_SECONDS = 0.5
+
+# Fixed crop size of ffmpeg-rendered crops: this percentile of the per-frame window sizes
+CROP_SIZE_PERCENTILE = 90
+
+# Chunks are at least this long so process start-up stays negligible
+MIN_CHUNK_SECONDS = 10
+
+# Re-run detection early when fewer than this fraction of tracked points survive
+TRACKING_MIN_CONFIDENCE = 0.5
+
+# Frames are downscaled to this width before optical flow tracking
+TRACKING_WIDTH = 320
+
+# Detection reads a proxy stream scaled to this width by ffmpeg (YOLO works at ~640 px anyway)
+app.config["ANALYSIS_WIDTH"] = int(os.environ.get("ANALYSIS_WIDTH", 640))
+
+# Scene-cut detection: frames are compared at SCENE_CUT_SIZE in grayscale. A cut is a frame whose mean
+# absolute difference to the previous one exceeds SCENE_CUT_THRESHOLD (0..1) and is SCENE_CUT_RATIO
+# times the difference before it (so camera motion doesn't count); shots are at least MIN_SCENE_FRAMES long
+app.config["SCENE_CUT_DETECTION"] = os.environ.get("SCENE_CUT_DETECTION", "1") == "1"
+SCENE_CUT_SIZE = (64, 36)
+SCENE_CUT_THRESHOLD = 0.12
+SCENE_CUT_RATIO = 3.0
+MIN_SCENE_FRAMES = 8
+
+# Models are loaded on first use (or in the background once the server is up, see PRELOAD_MODELS),
+# so plain resizes and debug reloads don't wait for Whisper and YOLO
+WHISPER_MODEL = "base"
+YOLO_WEIGHTS = "yolov8n.pt"
+app.config["PRELOAD_MODELS"] = os.environ.get("PRELOAD_MODELS", "1") == "1"
+
+# Run one dummy inference right after loading so the first job doesn't pay for initialisation
+app.config["MODEL_WARMUP"] = os.environ.get("MODEL_WARMUP", "1") == "1"
+
+def load_whisper_model():
+    """Loads (and optionally warms up) the Whisper STT model."""
+    import whisper
+    model = whisper.load_model(WHISPER_MODEL)
+    if app.config["MODEL_WARMUP"]:
+        model.transcribe(np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32))
+    return model
+
+def load_yolo_model():
+    """Loads (and optionally warms up) the YOLO model used for face tracking."""
     from ultralytics import YOLO
-    yolo_model = YOLO("yolov8n.pt")
-except Exception as e:
-    yolo_model = None
-    print(f"Warning: YOLO model could not be loaded. Face tracking will be disabled. Error: {e}")
+    model = YOLO(YOLO_WEIGHTS)
+    if app.config["MODEL_WARMUP"]:
+        model([np.zeros((640, 640, 3), dtype=np.uint8)], classes=[0], verbose=False)
+    return model
+
+MODEL_LOADERS = {"whisper": load_whisper_model, "yolo": load_yolo_model}
+MODEL_WARNINGS = {
+    "whisper": "Whisper model could not be loaded. Auto-captioning will be disabled.",
+    "yolo": "YOLO model could not be loaded. Face tracking will be disabled."
+}
+
+# Per-model state: status is one of "not_loaded", "loading", "ready" or "failed"
+_models = {}
+_model_status = {name: {"status": "not_loaded", "error": None} for name in MODEL_LOADERS}
+_model_locks = {name: threading.Lock() for name in MODEL_LOADERS}
+
+def get_model(name):
+    """Returns a loaded model, loading it on first use (blocking). Returns None if it failed to load."""
+    with _model_locks[name]:
+        status = _model_status[name]
+        if status["status"] in ("not_loaded", "loading"):
+            status["status"] = "loading"
+            try:
+                _models[name] = MODEL_LOADERS[name]()
+                status["status"] = "ready"
+            except Exception as e:
+                status.update(status="failed", error=str(e))
+                print(f"Warning: {MODEL_WARNINGS[name]} Error: {e}")
+    return _models.get(name)
+
+def preload_model(name):
+    """Starts loading a model in a background thread if nothing has loaded it yet."""
+    if _model_status[name]["status"] == "not_loaded":
+        _model_status[name]["status"] = "loading"
+        threading.Thread(target=get_model, args=(name,), daemon=True).start()
+
+def model_available(name):
+    """Returns True once the model is loaded and ready to use."""
+    return _model_status[name]["status"] == "ready"
+
+def model_usable(name):
+    """Returns True unless the model failed to load; a job waits for a model that isn't loaded yet."""
+    return _model_status[name]["status"] != "failed"
+
+def feature_status(name):
+    """Returns "available", "loading" (the model loads in the background or on first use) or "unavailable"."""
+    status = _model_status[name]["status"]
+    if status == "ready":
+        return "available"
+    return "unavailable" if status == "failed" else "loading"
+
+def model_status():
+    """Returns a snapshot of every model's loading status."""
+    return {name: dict(status) for name, status in _model_status.items()}
+
+@app.before_request
+def preload_models():
+    """Starts loading the models in the background once the server handles its first request."""
+    if app.config["PRELOAD_MODELS"]:
+        for name in MODEL_LOADERS:
+            preload_model(name)
 
 # Helper function to validate file extensions
 ALLOWED_EXTENSIONS = {"mp4", "mov", "avi", "mkv", "webm"}
@@ -45,6 +205,268 @@ ALLOWED_EXTENSIONS = {"mp4", "mov", "avi", "mkv", "webm"}
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Content hashes of input files, keyed by (path, size, mtime)
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+def file_content_hash(path):
+    """Returns the SHA-256 of a file's contents, hashing each version of a file only once."""
+    stat = os.stat(path)
+    # Uploads are stored under their hash (see stored_upload_path), so a request never has to read them
+    name = os.path.splitext(os.path.basename(path))[0]
+    if (re.fullmatch(r"[0-9a-f]{64}", name)
+            and os.path.dirname(os.path.abspath(path)) == os.path.abspath(app.config["UPLOAD_FOLDER"])):
+        return name
+
+    file_id = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if file_id in _file_hashes:
+            return _file_hashes[file_id]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+    with _file_hashes_lock:
+        _file_hashes[file_id] = digest.hexdigest()
+    return digest.hexdigest()
+
+# Media probe results, keyed by (path, size, mtime) like the content hashes
+_media_probes = {}
+_media_probes_lock = threading.Lock()
+
+def exact_frame_rate(rate):
+    """Returns a float frame rate as the Fraction it stands for, e.g. 29.97 -> 30000/1001."""
+    for denominator in (1, 1001):
+        numerator = round(rate * denominator / 1000) * 1000 if denominator == 1001 else round(rate)
+        if numerator and abs(numerator / denominator - rate) < 0.01:
+            return Fraction(numerator, denominator)
+    return Fraction(rate).limit_denominator(1000)
+
+def parse_video_header(stderr):
+    """Returns the codec, displayed size and rotation of the first video stream ffmpeg lists, or None."""
+    video = re.search(r"Stream #.*?: Video: (\w+).*?[ ,](\d{2,5})x(\d{2,5})[ ,\[]", stderr)
+    if not video:
+        return None
+    rotation = re.search(r"rotation of (-?[\d.]+) degrees", stderr)
+    rotation = round(float(rotation.group(1))) % 360 if rotation else 0
+    width, height = int(video.group(2)), int(video.group(3))
+    if rotation in (90, 270):
+        width, height = height, width
+    return {"video_codec": video.group(1), "width": width, "height": height, "rotation": rotation}
+
+def video_dimensions(video_path):
+    """Returns a video's displayed (width, height), reading only its header unless it was probed already."""
+    stat = os.stat(video_path)
+    file_id = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    with _media_probes_lock:
+        if file_id in _media_probes:
+            return _media_probes[file_id]["width"], _media_probes[file_id]["height"]
+
+    # Without an output ffmpeg lists the input and exits with an error
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", video_path], capture_output=True, text=True)
+    header = parse_video_header(result.stderr)
+    if not header:
+        raise ValueError(f"Could not probe {video_path}: {result.stderr.strip().splitlines()[-1:]}")
+    return header["width"], header["height"]
+
+def probe_video(video_path):
+    """Reads a video's container metadata once per version of the file.
+
+    Returns a dict with width and height (as displayed, i.e. after rotation),
+    rotation, fps (a Fraction), duration, frame_count, video_codec, audio_codec
+    (None without audio) and keyframes (frame indices in presentation order).
+    Packets are listed with ffmpeg's framecrc muxer and stream copy, so
+    nothing is decoded (the imageio-ffmpeg build MoviePy uses has no ffprobe).
+    """
+    stat = os.stat(video_path)
+    file_id = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    with _media_probes_lock:
+        if file_id in _media_probes:
+            return _media_probes[file_id]
+
+    result = subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-i", video_path,
+         "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+        capture_output=True, text=True
+    )
+    header = parse_video_header(result.stderr)
+    if result.returncode != 0 or not header:
+        raise ValueError(f"Could not probe {video_path}: {result.stderr.strip().splitlines()[-1:]}")
+
+    time_base = Fraction(1)
+    pts = []
+    is_key = []
+    for line in result.stdout.splitlines():
+        if line.startswith("#tb 0:"):
+            time_base = Fraction(line.split(":", 1)[1].strip())
+            continue
+        if line.startswith("#"):
+            continue
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) < 6:
+            continue
+        # Packets only carry an F= field when their flags differ from "keyframe"
+        flags = next((int(field[2:], 16) for field in fields[6:] if field.startswith("F=")), 1)
+        pts.append(int(fields[2]) if fields[2].lstrip("-").isdigit() else len(pts))
+        is_key.append(bool(flags & 1))
+
+    # Packets are listed in decode order; a frame's index is its rank in presentation order
+    ranks = np.empty(len(pts), dtype=np.int64)
+    ranks[np.argsort(pts, kind="stable")] = np.arange(len(pts))
+
+    # Average frame interval over the whole stream, falling back to the rate ffmpeg reports
+    stated_fps = re.search(r"Video: .*?, ([\d.]+) fps", result.stderr)
+    if len(pts) > 1 and max(pts) > min(pts):
+        fps = exact_frame_rate(float((len(pts) - 1) / ((max(pts) - min(pts)) * time_base)))
+    elif stated_fps:
+        fps = exact_frame_rate(float(stated_fps.group(1)))
+    else:
+        fps = Fraction(30)
+
+    duration = re.search(r"Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)", result.stderr)
+    audio = re.search(r"Stream #.*?: Audio: (\w+)", result.stderr)
+
+    probe = {
+        "width": header["width"],
+        "height": header["height"],
+        "rotation": header["rotation"],
+        "fps": fps,
+        "duration": (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+                     if duration else len(pts) / fps),
+        "frame_count": len(pts),
+        "video_codec": header["video_codec"],
+        "audio_codec": audio.group(1) if audio else None,
+        "keyframes": sorted(ranks[np.array(is_key, dtype=bool)].tolist()),
+    }
+    with _media_probes_lock:
+        _media_probes[file_id] = probe
+    return probe
+
+# In-flight analysis steps, so concurrent requests for the same video share one computation
+_analysis_tasks = {}
+_analysis_tasks_lock = threading.Lock()
+
+# Seconds between progress updates relayed to callers waiting on a shared analysis step
+ANALYSIS_WAIT_INTERVAL = 0.5
+
+def run_once(key, compute, progress=None):
+    """Returns compute(progress), but while a call with the same key is running, waits for it and shares its result.
+
+    The running call's progress is relayed to each waiter's own progress
+    callback, so a waiting job still reports progress and can be cancelled.
+    If the running call's job is cancelled, a waiter takes over the computation
+    instead of failing with it.
+    """
+    while True:
+        with _analysis_tasks_lock:
+            task = _analysis_tasks.get(key)
+            owner = task is None
+            if owner:
+                task = _analysis_tasks[key] = {"future": Future(), "progress": None}
+        if owner:
+            break
+
+        while not wait([task["future"]], timeout=ANALYSIS_WAIT_INTERVAL).done:
+            if progress and task["progress"]:
+                progress(*task["progress"])
+        if not task["future"].cancelled():
+            return task["future"].result()
+
+    def report(stage, done, total):
+        task["progress"] = (stage, done, total)
+        if progress:
+            progress(stage, done, total)
+
+    try:
+        result = compute(report)
+        task["future"].set_result(result)
+        return result
+    except JobCancelled:
+        # Only this caller was cancelled; waiters start over
+        with _analysis_tasks_lock:
+            del _analysis_tasks[key]
+        task["future"].cancel()
+        task["future"].set_running_or_notify_cancel()
+        raise
+    except BaseException as e:
+        task["future"].set_exception(e)
+        raise
+    finally:
+        with _analysis_tasks_lock:
+            if _analysis_tasks.get(key) is task:
+                del _analysis_tasks[key]
+
+def save_json(path, value):
+    """Writes a JSON cache file atomically."""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(value, f)
+    os.replace(temp_path, path)
+    return path
+
+# Upload pre-analysis runs one video at a time, in the background
+_preanalysis_executor = ThreadPoolExecutor(max_workers=1)
+
+def preanalyze_video(video_path):
+    """Fills every per-video cache for a freshly uploaded file.
+
+    Computes the content hash, probes the metadata, queues the transcription,
+    finds scene cuts and builds the low-resolution detection index. Steps whose results are already
+    cached are skipped, and a later /process_video picks up whatever has
+    finished (or joins a step still running) and computes only the rest.
+    """
+    try:
+        file_content_hash(video_path)
+        probe_video(video_path)
+        if model_usable("whisper"):
+            start_transcription(video_path)
+        video_scene_cuts(video_path)
+        if load_detection_index(video_path) is None and get_model("yolo") is not None:
+            build_detection_index(video_path, app.config["DETECTION_BATCH_SIZE"], app.config["DETECTION_INTERVAL"])
+    except Exception as e:
+        print(f"Error pre-analysing {video_path}: {e}")
+
+def upload_extension(filename):
+    """Returns the lower-case extension of an uploaded file name."""
+    return filename.rsplit(".", 1)[1].lower()
+
+def stored_upload_path(content_hash, extension):
+    """Returns where an upload is stored: uploads are content-addressed, so identical files share one path."""
+    return os.path.join(app.config["UPLOAD_FOLDER"], f"{content_hash}.{extension}")
+
+def store_upload(part_path, content_hash, extension):
+    """Moves a fully received file to its content-addressed path and returns (file_path, deduplicated).
+
+    When the same content is already stored, the new copy is discarded.
+    """
+    file_path = stored_upload_path(content_hash, extension)
+    deduplicated = os.path.exists(file_path)
+    if deduplicated:
+        os.remove(part_path)
+    else:
+        os.replace(part_path, file_path)
+
+    # Seed the content hash cache so downstream caches don't hash the file again
+    stat = os.stat(file_path)
+    with _file_hashes_lock:
+        _file_hashes[(os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)] = content_hash
+
+    # Analyse while the user is still choosing settings
+    if app.config["UPLOAD_PREANALYSIS"]:
+        _preanalysis_executor.submit(preanalyze_video, file_path)
+    return file_path, deduplicated
+
+def write_stream(stream, f, digest):
+    """Copies a request stream into an open file, feeding every block to a running hash. Returns bytes written."""
+    written = 0
+    for block in iter(lambda: stream.read(1024 * 1024), b""):
+        f.write(block)
+        digest.update(block)
+        written += len(block)
+    return written
+
 @app.route("/upload", methods=["POST"])
 def upload_file():
     """Handles file upload from the frontend."""
@@ -59,14 +481,208 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({"error": "File type not allowed"}), 400
 
-    # Save the file to the upload folder
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(file_path)
+    # Hash the file while saving it, then store it under its content hash
+    cleanup_stale_uploads()
+    part_path = os.path.join(app.config["PARTIAL_UPLOAD_FOLDER"], f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    with open(part_path, "wb") as f:
+        write_stream(file.stream, f, digest)
+    file_path, deduplicated = store_upload(part_path, digest.hexdigest(), upload_extension(file.filename))
 
     return jsonify({
         "message": "File uploaded successfully",
-        "file_path": file_path
+        "file_path": file_path,
+        "content_hash": digest.hexdigest(),
+        "deduplicated": deduplicated
+    })
+
+# Resumable uploads being received, keyed by upload id; each holds its running hash
+_upload_sessions = {}
+_upload_sessions_lock = threading.Lock()
+
+def upload_session_paths(upload_id):
+    """Returns the (data, state) paths of a resumable upload."""
+    base = os.path.join(app.config["PARTIAL_UPLOAD_FOLDER"], upload_id)
+    return f"{base}.part", f"{base}.json"
+
+def get_upload_session(upload_id):
+    """Returns a resumable upload session, or None if there is no such upload.
+
+    Sessions live in memory; after a restart one is rebuilt from its state
+    file, re-hashing the bytes received so far.
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        return None
+    with _upload_sessions_lock:
+        session = _upload_sessions.get(upload_id)
+        if session is not None:
+            return session
+
+        part_path, state_path = upload_session_paths(upload_id)
+        if not os.path.exists(state_path) or not os.path.exists(part_path):
+            return None
+        with open(state_path) as f:
+            session = json.load(f)
+        # Only acknowledged bytes count; anything after them may be from an interrupted chunk
+        session["digest"] = hashlib.sha256()
+        remaining = session["offset"]
+        with open(part_path, "rb") as f:
+            while remaining:
+                block = f.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                session["digest"].update(block)
+                remaining -= len(block)
+        session["offset"] -= remaining
+        session["lock"] = threading.Lock()
+        _upload_sessions[upload_id] = session
+        return session
+
+_last_upload_cleanup = 0.0
+
+def cleanup_stale_uploads():
+    """Deletes resumable uploads (and partial files of interrupted uploads) idle for longer than UPLOAD_SESSION_TTL."""
+    global _last_upload_cleanup
+    now = time.time()
+    if now - _last_upload_cleanup < UPLOAD_CLEANUP_INTERVAL:
+        return
+    _last_upload_cleanup = now
+
+    cutoff = now - app.config["UPLOAD_SESSION_TTL"]
+    folder = app.config["PARTIAL_UPLOAD_FOLDER"]
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            with _upload_sessions_lock:
+                _upload_sessions.pop(name.split(".", 1)[0], None)
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+
+def upload_status(session):
+    """JSON body describing a resumable upload."""
+    return {"upload_id": session["upload_id"], "offset": session["offset"], "size": session["size"]}
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """Starts a resumable upload.
+
+    Takes {"filename", "size"} and optionally the file's "sha256"; if that
+    content is already stored, the upload completes immediately without any
+    bytes being sent. Otherwise the file is sent in chunks with
+    PUT /uploads/<upload_id>.
+    """
+    cleanup_stale_uploads()
+    data = request.json or {}
+    filename = data.get("filename", "")
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+    try:
+        size = int(data["size"])
+        if size <= 0:
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "size must be a positive number of bytes"}), 400
+
+    content_hash = str(data.get("sha256", "")).lower()
+    if re.fullmatch(r"[0-9a-f]{64}", content_hash):
+        file_path = stored_upload_path(content_hash, upload_extension(filename))
+        if os.path.exists(file_path) and os.path.getsize(file_path) == size:
+            return jsonify({
+                "message": "File uploaded successfully",
+                "file_path": file_path,
+                "content_hash": content_hash,
+                "deduplicated": True
+            })
+
+    upload_id = uuid.uuid4().hex
+    part_path, state_path = upload_session_paths(upload_id)
+    open(part_path, "wb").close()
+    session = {"upload_id": upload_id, "extension": upload_extension(filename), "size": size, "offset": 0}
+    save_json(state_path, session)
+    with _upload_sessions_lock:
+        _upload_sessions[upload_id] = dict(session, digest=hashlib.sha256(), lock=threading.Lock())
+    return jsonify(upload_status(session)), 201
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    """Returns how many bytes of a resumable upload have been received, so a client knows where to resume."""
+    session = get_upload_session(upload_id)
+    if session is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload_status(session))
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Appends the request body to a resumable upload.
+
+    The chunk must start at the upload's current offset, given as
+    "Content-Range: bytes <start>-<end>/<size>" (without the header it is
+    appended as is). A chunk at any other offset gets a 409 with the offset
+    to resume from; a range outside the declared size gets a 416, and a body
+    whose length doesn't match the range a 400. The chunk that completes the
+    file returns its content-addressed file_path and content_hash.
+    """
+    session = get_upload_session(upload_id)
+    if session is None:
+        return jsonify({"error": "Upload not found"}), 404
+
+    with session["lock"]:
+        # A concurrent request may have completed the upload while this one waited
+        if session["offset"] >= session["size"]:
+            return jsonify({"error": "Upload already complete"}), 409
+
+        content_range = request.headers.get("Content-Range")
+        expected_length = None
+        if content_range:
+            match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range.strip())
+            if not match or int(match.group(2)) < int(match.group(1)):
+                return jsonify({"error": "Invalid Content-Range"}), 400
+            start, end, total = match.groups()
+            if (total != "*" and int(total) != session["size"]) or int(end) >= session["size"]:
+                return jsonify(dict(upload_status(session), error="Content-Range is outside the declared size")), 416
+            if int(start) != session["offset"]:
+                return jsonify(dict(upload_status(session), error="Chunk does not start at the upload offset")), 409
+            expected_length = int(end) - int(start) + 1
+            if request.content_length is not None and request.content_length != expected_length:
+                return jsonify(dict(upload_status(session), error="Chunk length does not match Content-Range")), 400
+
+        part_path, state_path = upload_session_paths(upload_id)
+        with open(part_path, "r+b") as f:
+            # Drop anything past the acknowledged offset, e.g. from a chunk interrupted mid-write
+            f.truncate(session["offset"])
+            f.seek(session["offset"])
+            digest = session["digest"].copy()
+            written = write_stream(request.stream, f, digest)
+        error = None
+        if session["offset"] + written > session["size"]:
+            error = "Chunk runs past the declared size"
+        elif expected_length is not None and written != expected_length:
+            error = "Chunk length does not match Content-Range"
+        if error:
+            with open(part_path, "r+b") as f:
+                f.truncate(session["offset"])
+            return jsonify(dict(upload_status(session), error=error)), 400
+
+        session["digest"] = digest
+        session["offset"] += written
+        save_json(state_path, {key: session[key] for key in ("upload_id", "extension", "size", "offset")})
+        if session["offset"] < session["size"]:
+            return jsonify(upload_status(session))
+
+        content_hash = digest.hexdigest()
+        file_path, deduplicated = store_upload(part_path, content_hash, session["extension"])
+        os.remove(state_path)
+        with _upload_sessions_lock:
+            _upload_sessions.pop(upload_id, None)
+
+    return jsonify({
+        "message": "File uploaded successfully",
+        "file_path": file_path,
+        "content_hash": content_hash,
+        "deduplicated": deduplicated
     })
 
 @app.route("/get_resolution", methods=["POST"])
@@ -76,10 +692,7 @@ def get_resolution():
     video_path = data["file_path"]
 
     try:
-        cap = cv2.VideoCapture(video_path)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        cap.release()
+        width, height = video_dimensions(video_path)
 
         return jsonify({
             "resolution": f"{width}x{height}",
@@ -89,6 +702,24 @@ def get_resolution():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/probe", methods=["POST"])
+def probe():
+    """Returns the container metadata of the uploaded video."""
+    data = request.json
+    video_path = data["file_path"]
+
+    try:
+        metadata = dict(probe_video(video_path))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Keyframe positions are summarised; the full list can run to thousands of entries
+    keyframes = metadata.pop("keyframes")
+    metadata["keyframe_count"] = len(keyframes)
+    metadata["fps_rational"] = str(metadata["fps"])
+    metadata["fps"] = float(metadata["fps"])
+    return jsonify(metadata)
+
 def parse_aspect_ratio(aspect_ratio_str):
     """Parse an aspect ratio string like '16:9' into a tuple of integers."""
     match = re.match(r'(\d+):(\d+)', aspect_ratio_str)
@@ -96,12 +727,34 @@ def parse_aspect_ratio(aspect_ratio_str):
         return (int(match.group(1)), int(match.group(2)))
     return None
 
-def resize_video(video_path, output_path, aspect_ratio_str, resolution_percentage):
-    """Resizes the video based on the percentage of original resolution while maintaining aspect ratio."""
+class JobProgressLogger(proglog.ProgressBarLogger):
+    """MoviePy logger that forwards frame progress to a job progress callback."""
+
+    def __init__(self, stage, progress):
+        super().__init__()
+        self.stage = stage
+        self.progress = progress
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == "t" and attr == "index":
+            self.progress(self.stage, value + 1, self.bars[bar]["total"])
+
+def moviepy_logger(stage, progress):
+    """Returns the logger to pass to MoviePy's write_videofile."""
+    return JobProgressLogger(stage, progress) if progress else "bar"
+
+def resize_video(video_path, output_path, aspect_ratio_str, resolution_percentage, progress=None, parallel=False,
+                 captions=None, engine=None):
+    """Resizes the video based on the percentage of original resolution while maintaining aspect ratio.
+
+    captions, if given, are burned in during the same encode.
+    engine ("ffmpeg" or "python", default RENDER_ENGINE) picks how caption-free resizes run.
+    With parallel=True, long videos are split at keyframes and resized in a process pool.
+    """
     try:
         # Get original resolution
-        clip = mp.VideoFileClip(video_path)
-        original_width, original_height = clip.size
+        probe = probe_video(video_path)
+        original_width, original_height = probe["width"], probe["height"]
 
         # Calculate new resolution
         scale_factor = resolution_percentage / 100
@@ -117,18 +770,728 @@ def resize_video(video_path, output_path, aspect_ratio_str, resolution_percentag
 
         print(f"Resizing video to {new_width}x{new_height}")
 
+        # Captions are composited into every frame, so this is where transcription is joined
+        captions = resolve_captions(captions)
+
+        # Without captions there is no per-frame Python work, so ffmpeg can do the whole job
+        if (engine or app.config["RENDER_ENGINE"]) == "ffmpeg" and not captions:
+            return ffmpeg_resize(video_path, output_path, new_width, new_height, progress)
+
+        if parallel:
+            chunks = plan_video_chunks(video_path)
+            if len(chunks) > 1:
+                options = {"mode": "resize", "width": new_width, "height": new_height, "captions": captions}
+                render_chunked(video_path, output_path, chunks, options, progress, "resize")
+                return output_path
+
         # Resize video
+        clip = mp.VideoFileClip(video_path)
         resized_clip = clip.resize(newsize=(new_width, new_height))
-        resized_clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
+        if captions:
+            overlay = make_caption_overlay(captions, new_width, new_height)
+            resized_clip = resized_clip.fl(lambda get_frame, t: overlay(get_frame(t), t))
+        resized_clip.write_videofile(output_path, logger=moviepy_logger("resize", progress),
+                                     **moviepy_write_options(output_path))
 
         return output_path
     except Exception as e:
         print(f"Error resizing video: {e}")
         return None
 
-def crop_video_to_face(video_path, output_path, aspect_ratio_str, target_width, target_height):
-    """Crops the video to track faces and resizes to target dimensions."""
-    if yolo_model is None:
+# Encoders per output container; containers not listed get H.264 + AAC
+CONTAINER_ENCODERS = {"webm": ("libvpx-vp9", "libopus")}
+
+def output_codecs(output_path):
+    """Returns the (video, audio) encoders for an output file's container."""
+    container = os.path.splitext(output_path)[1].lstrip(".").lower()
+    return CONTAINER_ENCODERS.get(container, ("libx264", "aac"))
+
+def moviepy_write_options(output_path):
+    """Returns the write_videofile arguments that encode for output_path's container."""
+    video_codec, audio_codec = output_codecs(output_path)
+    # MoviePy only knows the temp audio extension of a few codecs, libopus not among them,
+    # and Opus only encodes at 48 kHz rather than MoviePy's default 44.1 kHz
+    opus = audio_codec == "libopus"
+    temp_audiofile = f"audio_{uuid.uuid4().hex}.{'ogg' if opus else 'm4a'}"
+    return {
+        "codec": video_codec,
+        "audio_codec": audio_codec,
+        "audio_fps": 48000 if opus else 44100,
+        "temp_audiofile": os.path.join(app.config["TEMP_FOLDER"], temp_audiofile),
+        "ffmpeg_params": muxer_options(output_path),
+    }
+
+# Containers written faststart (index before the media data) so playback can begin from the first bytes
+FASTSTART_CONTAINERS = {"mp4", "mov"}
+
+def muxer_options(output_path):
+    """Returns ffmpeg output options for a final output file's container."""
+    container = os.path.splitext(output_path)[1].lstrip(".").lower()
+    return ["-movflags", "+faststart"] if container in FASTSTART_CONTAINERS else []
+
+# Audio codecs each container can hold as-is (None: anything); other audio is re-encoded
+CONTAINER_AUDIO_CODECS = {
+    "mp4": {"aac", "mp3", "alac", "ac3", "eac3", "opus"},
+    "mov": {"aac", "mp3", "alac", "ac3", "pcm_s16le"},
+    "avi": {"aac", "mp3", "ac3", "pcm_s16le"},
+    "webm": {"opus", "vorbis"},
+    "mkv": None,
+}
+
+def ffmpeg_resize(video_path, output_path, width, height, progress=None):
+    """Scales a video to width x height in a single ffmpeg filter graph, without decoding frames in Python.
+
+    progress, if given, is called as progress("resize", frames_done, frames_total).
+    """
+    return run_ffmpeg_filter(video_path, output_path, f"scale={width}:{height},setsar=1", width, height,
+                             "resize", progress)
+
+def run_ffmpeg_filter(video_path, output_path, video_filter, width, height, stage, progress=None,
+                      duration=None, preset=None):
+    """Renders a video through an ffmpeg filter graph producing width x height frames.
+
+    Audio is stream-copied when the output container can hold the source codec.
+    duration, if given, limits the output to the first duration seconds and
+    preset picks the x264 preset.
+    progress, if given, is called as progress(stage, frames_done, frames_total).
+    """
+    container = os.path.splitext(output_path)[1].lstrip(".").lower()
+    video_codec, audio_codec = output_codecs(output_path)
+    probe = probe_video(video_path)
+    source_audio_codec = probe["audio_codec"]
+    copyable = CONTAINER_AUDIO_CODECS.get(container, set())
+    if source_audio_codec and (copyable is None or source_audio_codec in copyable):
+        audio_codec = "copy"
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+        "-i", video_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", video_filter,
+        # The exact source rate: filters like setpts drop it, and the encoder would fall back to 25 fps
+        "-r", str(probe["fps"]),
+        "-c:v", video_codec, "-c:a", audio_codec,
+    ]
+    # Same pixel formats MoviePy picks: 4:2:0 where the dimensions allow it
+    cmd += ["-pix_fmt", "yuv420p" if width % 2 == 0 and height % 2 == 0 else "yuv444p"]
+    if preset and video_codec == "libx264":
+        cmd += ["-preset", preset]
+    if duration:
+        cmd += ["-t", str(duration)]
+    cmd += muxer_options(output_path)
+    cmd.append(output_path)
+
+    total_frames = probe["frame_count"]
+    if duration:
+        total_frames = min(total_frames, math.ceil(duration * probe["fps"]))
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "frame" and progress:
+                progress(stage, min(int(value), total_frames), total_frames)
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg {stage} exited with status {process.returncode}")
+    return output_path
+
+def start_encoder(output_path, width, height, fps, pix_fmt="bgr24", threads=None):
+    """Starts an ffmpeg process that encodes raw frames written to its stdin, with the encoder for its container."""
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", pix_fmt,
+        "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "-",
+        "-an", "-c:v", output_codecs(output_path)[0],
+    ]
+    if width % 2 == 0 and height % 2 == 0:
+        cmd += ["-pix_fmt", "yuv420p"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd.append(output_path)
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+def finish_encoder(encoder):
+    """Closes the encoder input and waits for ffmpeg to flush the output."""
+    if encoder.stdin and not encoder.stdin.closed:
+        encoder.stdin.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg encoder exited with status {encoder.returncode}")
+
+def mux_audio(video_only_path, audio_source_path, output_path):
+    """Copies the encoded video and adds the first audio track of the source, if any.
+
+    video_only_path must already hold the video codec of output_path's
+    container (see start_encoder); the audio is encoded to match it.
+    """
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-i", video_only_path, "-i", audio_source_path,
+        "-map", "0:v:0", "-map", "1:a:0?",
+        "-c:v", "copy", "-c:a", output_codecs(output_path)[1], "-shortest",
+        *muxer_options(output_path),
+        output_path,
+    ]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+_END_OF_STREAM = object()
+
+def _queue_put(q, item, stop):
+    """Puts an item on a bounded queue, giving up once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _queue_iter(q, stop):
+    """Yields items from a queue until the end-of-stream marker or a stop."""
+    while True:
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _END_OF_STREAM:
+            return
+        yield item
+
+def stream_stage(items, stop, errors, maxsize=FRAME_QUEUE_SIZE):
+    """Drains an iterator on a background thread into a bounded queue and iterates over that queue."""
+    outbox = queue.Queue(maxsize=maxsize)
+
+    def worker():
+        try:
+            for item in items:
+                if not _queue_put(outbox, item, stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _queue_put(outbox, _END_OF_STREAM, stop)
+
+    threading.Thread(target=worker, daemon=True).start()
+    return _queue_iter(outbox, stop)
+
+def read_frames(cap):
+    """Yields decoded BGR frames from an open cv2.VideoCapture."""
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break  # Stop if video ends
+        yield frame
+
+def batched(items, batch_size):
+    """Groups an iterator into lists of up to batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Shared YOLO inference service: (frames, future) requests from every job in this process
+_inference_requests = queue.Queue()
+_inference_thread = None
+_inference_thread_lock = threading.Lock()
+# Callers currently inside run_yolo; each has at most one request outstanding
+_inference_callers = 0
+_inference_callers_lock = threading.Lock()
+
+def inference_worker():
+    """Owns the YOLO model, forming dynamic batches across jobs and routing results back to each request.
+
+    A batch waits up to INFERENCE_MAX_LATENCY_MS for more requests only while
+    other callers could still add one; a lone job is served immediately.
+    """
+    while True:
+        pending = [_inference_requests.get()]
+        num_frames = len(pending[0][0])
+        deadline = time.monotonic() + app.config["INFERENCE_MAX_LATENCY_MS"] / 1000
+        while num_frames < app.config["INFERENCE_MAX_BATCH"]:
+            with _inference_callers_lock:
+                if len(pending) >= _inference_callers:
+                    break
+            try:
+                item = _inference_requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            pending.append(item)
+            num_frames += len(item[0])
+
+        try:
+            model = get_model("yolo")
+            if model is None:
+                raise RuntimeError("YOLO model not loaded")
+            results = model([frame for frames, _ in pending for frame in frames], classes=[0], verbose=False)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            continue
+
+        offset = 0
+        for frames, future in pending:
+            future.set_result(results[offset:offset + len(frames)])
+            offset += len(frames)
+
+def run_yolo(frames):
+    """Submits frames to the shared inference service and waits for their YOLO results."""
+    global _inference_thread, _inference_callers
+    with _inference_thread_lock:
+        if _inference_thread is None:
+            _inference_thread = threading.Thread(target=inference_worker, daemon=True)
+            _inference_thread.start()
+
+    future = Future()
+    with _inference_callers_lock:
+        _inference_callers += 1
+    try:
+        _inference_requests.put((list(frames), future))
+        return future.result()
+    finally:
+        with _inference_callers_lock:
+            _inference_callers -= 1
+
+def detect_person_boxes(frames):
+    """Runs YOLO over a batch of frames (via the shared inference service) and returns (boxes, confidences).
+
+    boxes is an (N, 4) float32 array holding the highest-confidence person box
+    (x1, y1, x2, y2) of each frame and confidences its (N,) scores; both are
+    NaN for frames where no person was detected.
+    """
+    boxes = np.full((len(frames), 4), np.nan, dtype=np.float32)
+    confidences = np.full(len(frames), np.nan, dtype=np.float32)
+    results = run_yolo(frames)
+    for i, result in enumerate(results):
+        if len(result.boxes) == 0:
+            continue
+        cls = result.boxes.cls.cpu().numpy()
+        people = np.flatnonzero(cls == 0)
+        if len(people) > 0:
+            boxes[i] = result.boxes.xyxy.cpu().numpy()[people[0]]
+            confidences[i] = result.boxes.conf.cpu().numpy()[people[0]]
+    return boxes, confidences
+
+def track_box(prev_gray, gray, box):
+    """Moves a box from prev_gray to gray using sparse optical flow.
+
+    Returns the shifted box and a confidence in [0, 1], the fraction of
+    feature points inside the box that could be tracked.
+    """
+    if np.isnan(box).any():
+        return box, 1.0  # Nothing to track until the next detection
+
+    height, width = prev_gray.shape
+    x1, y1, x2, y2 = np.clip(box, 0, [width, height, width, height]).astype(int)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return box, 0.0
+
+    mask = np.zeros_like(prev_gray)
+    mask[y1:y2, x1:x2] = 255
+    points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=50, qualityLevel=0.01, minDistance=5, mask=mask)
+    if points is None or len(points) < 4:
+        return box, 0.0
+
+    new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None)
+    tracked = status.ravel() == 1
+    if tracked.sum() < 4:
+        return box, 0.0
+
+    dx, dy = np.median(new_points[tracked] - points[tracked], axis=0).ravel()
+    return box + np.array([dx, dy, dx, dy], dtype=np.float32), float(tracked.mean())
+
+def track_person_boxes(frames, detect_interval, batch_size, cuts=None):
+    """Yields (frame, box, confidence, detected), running YOLO only on keyframes and tracking the box in between.
+
+    Every detect_interval-th frame is a keyframe; keyframes are detected
+    batch_size at a time. Frames where tracking confidence drops below
+    TRACKING_MIN_CONFIDENCE are re-detected on their own. confidence is the
+    YOLO score on detected frames and the tracking confidence otherwise.
+
+    With cuts (sorted indices, relative to the first frame, where a new shot
+    starts), the first frame of every shot is a keyframe too and the interval
+    restarts there, so the box is never tracked across a cut.
+    """
+    scale = None
+    prev_gray = None
+    box = None
+    offset = 0
+
+    for window in batched(frames, detect_interval * batch_size):
+        keyframes = []
+        for i in range(len(window)):
+            shot = bisect.bisect_right(cuts, offset + i) - 1 if cuts else -1
+            shot_start = cuts[shot] if shot >= 0 else 0
+            if (offset + i - shot_start) % detect_interval == 0:
+                keyframes.append(i)
+        keyframe_boxes, keyframe_confidences = detect_person_boxes([window[i] for i in keyframes]) if keyframes \
+            else ([], [])
+        keyframe_lookup = {i: k for k, i in enumerate(keyframes)}
+        if scale is None:
+            scale = min(1.0, TRACKING_WIDTH / window[0].shape[1])
+
+        for i, frame in enumerate(window):
+            gray = None
+            if detect_interval > 1:
+                gray = cv2.cvtColor(cv2.resize(frame, None, fx=scale, fy=scale), cv2.COLOR_BGR2GRAY)
+
+            detected = i in keyframe_lookup
+            if detected:
+                box = keyframe_boxes[keyframe_lookup[i]]
+                confidence = keyframe_confidences[keyframe_lookup[i]]
+            else:
+                small_box, confidence = track_box(prev_gray, gray, box * scale)
+                box = small_box / scale
+                if confidence < TRACKING_MIN_CONFIDENCE:
+                    boxes, confidences = detect_person_boxes([frame])
+                    box, confidence, detected = boxes[0], confidences[0], True
+
+            prev_gray = gray
+            yield frame, box, confidence, detected
+        offset += len(window)
+
+def compute_crop_windows(boxes, frame_width, frame_height, target_ratio):
+    """Computes crop windows (x1, y1, x2, y2) for an (N, 4) array of person boxes in one vectorized pass.
+
+    Each window keeps the target aspect ratio around the person box, clipped
+    to the frame. Rows without a box (NaN) get a centered window instead.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    has_box = ~np.isnan(boxes).any(axis=1)
+    x1, y1, x2, y2 = np.where(has_box[:, None], boxes, 0).astype(np.int64).T
+
+    # Adjust crop size to maintain target aspect ratio around the face
+    face_width = x2 - x1
+    face_height = y2 - y1
+    center_x = (x1 + x2) // 2
+    center_y = (y1 + y2) // 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        widen = target_ratio > face_width / face_height
+    new_width = np.where(widen, (face_height * target_ratio).astype(np.int64), face_width)
+    new_height = np.where(widen, face_height, (face_width / target_ratio).astype(np.int64))
+
+    # Ensure cropping doesn't exceed frame boundaries
+    windows = np.stack([
+        np.maximum(0, center_x - new_width // 2),
+        np.maximum(0, center_y - new_height // 2),
+        np.minimum(frame_width, center_x + new_width // 2),
+        np.minimum(frame_height, center_y + new_height // 2)
+    ], axis=1)
+
+    # Center crop when no face detected (or the face window is empty)
+    if frame_width / frame_height > target_ratio:
+        new_width = int(frame_height * target_ratio)
+        start = (frame_width - new_width) // 2
+        center_window = [start, 0, start + new_width, frame_height]
+    else:
+        new_height = int(frame_width / target_ratio)
+        start = (frame_height - new_height) // 2
+        center_window = [0, start, frame_width, start + new_height]
+    empty = (windows[:, 2] <= windows[:, 0]) | (windows[:, 3] <= windows[:, 1])
+    windows[~has_box | empty] = center_window
+    return windows
+
+def crop_frame(frame, window, target_width, target_height):
+    """Crops a frame to a window (x1, y1, x2, y2) and resizes it to the target size."""
+    x1, y1, x2, y2 = window
+    return cv2.resize(frame[y1:y2, x1:x2], (target_width, target_height))
+
+def scene_cuts_path(video_path):
+    """Returns the sidecar path of the scene cuts of a video's content."""
+    return os.path.join(app.config["CACHE_FOLDER"], f"{file_content_hash(video_path)}_scenecuts.json")
+
+def detect_scene_cuts(video_path):
+    """Returns the sorted frame indices where a new shot starts (frame 0 not included), cached per video content.
+
+    ffmpeg decodes the video straight to tiny grayscale frames, which are
+    compared in NumPy blocks, so no full-size frame reaches Python.
+    """
+    cache_path = scene_cuts_path(video_path)
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+    return run_once(("scene_cuts", file_content_hash(video_path)), lambda _: _scan_scene_cuts(video_path, cache_path))
+
+def _scan_scene_cuts(video_path, cache_path):
+    width, height = SCENE_CUT_SIZE
+    process = subprocess.Popen(
+        [FFMPEG_BINARY, "-loglevel", "error", "-i", video_path, "-map", "0:v:0", "-fps_mode", "passthrough",
+         "-vf", f"scale={width}:{height},format=gray", "-f", "rawvideo", "-"],
+        stdout=subprocess.PIPE
+    )
+    differences = []
+    previous = None
+    try:
+        while True:
+            data = process.stdout.read(width * height * 1024)
+            if not data:
+                break
+            block = np.frombuffer(data, dtype=np.uint8)[:len(data) // (width * height) * width * height]
+            block = block.reshape(-1, height, width).astype(np.int16)
+            if previous is not None:
+                block = np.concatenate([previous[None], block])
+            differences.append(np.abs(np.diff(block, axis=0)).mean(axis=(1, 2)) / 255)
+            previous = block[-1]
+    finally:
+        process.stdout.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg scene-cut scan exited with status {process.returncode}")
+
+    # differences[i] compares frames i and i + 1
+    differences = np.concatenate(differences) if differences else np.zeros(0)
+    before = np.concatenate([[0.0], differences[:-1]])
+    candidates = np.flatnonzero((differences > SCENE_CUT_THRESHOLD) & (differences > SCENE_CUT_RATIO * before)) + 1
+    cuts = []
+    for cut in candidates.tolist():
+        if cut - (cuts[-1] if cuts else 0) >= MIN_SCENE_FRAMES:
+            cuts.append(cut)
+
+    save_json(cache_path, cuts)
+    return cuts
+
+def video_scene_cuts(video_path):
+    """Returns a video's scene cuts, or None when SCENE_CUT_DETECTION is off or the scan fails."""
+    if not app.config["SCENE_CUT_DETECTION"]:
+        return None
+    try:
+        return detect_scene_cuts(video_path)
+    except Exception as e:
+        print(f"Error detecting scene cuts: {e}")
+        return None
+
+def smooth_crop_path(windows, frame_width, frame_height, target_ratio, fps, cuts=None):
+    """Turns per-frame crop windows into a fixed-size, smoothed crop path: an (N, 4) int array of (x, y, w, h).
+
+    The crop size is the CROP_SIZE_PERCENTILE-th percentile of the window sizes
+    (kept at the target aspect ratio and inside the frame), and the window
+    centers are smoothed with a centered moving average over CROP_SMOOTHING_SECONDS.
+    With cuts, each shot is smoothed on its own so the crop jumps at a cut instead of panning across it.
+    """
+    windows = np.asarray(windows, dtype=np.float64).reshape(-1, 4)
+    height = np.percentile(windows[:, 3] - windows[:, 1], CROP_SIZE_PERCENTILE)
+    width = height * target_ratio
+    if width > frame_width:
+        width, height = frame_width, frame_width / target_ratio
+    if height > frame_height:
+        width, height = frame_height * target_ratio, frame_height
+    width, height = max(2, int(width) // 2 * 2), max(2, int(height) // 2 * 2)
+
+    centers = (windows[:, :2] + windows[:, 2:]) / 2
+    bounds = [0] + [cut for cut in (cuts or []) if 0 < cut < len(centers)] + [len(centers)]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        radius = min(max(0, int(fps * CROP_SMOOTHING_SECONDS) // 2), end - start - 1)
+        if radius > 0:
+            kernel = np.ones(2 * radius + 1) / (2 * radius + 1)
+            padded = np.pad(centers[start:end], ((radius, radius), (0, 0)), mode="edge")
+            centers[start:end] = np.stack(
+                [np.convolve(padded[:, axis], kernel, mode="valid") for axis in range(2)], axis=1
+            )
+
+    path = np.empty((len(windows), 4), dtype=np.int64)
+    path[:, 0] = np.clip(np.round(centers[:, 0] - width / 2), 0, frame_width - width)
+    path[:, 1] = np.clip(np.round(centers[:, 1] - height / 2), 0, frame_height - height)
+    path[:, 2] = width
+    path[:, 3] = height
+    return path
+
+def crop_path_file(video_path, aspect_ratio):
+    """Returns the sidecar path of a video's smoothed crop path for an aspect ratio (w, h)."""
+    divisor = math.gcd(*aspect_ratio) or 1
+    model_version = os.path.splitext(os.path.basename(YOLO_WEIGHTS))[0]
+    ratio = f"{aspect_ratio[0] // divisor}x{aspect_ratio[1] // divisor}"
+    return os.path.join(app.config["CACHE_FOLDER"], f"{file_content_hash(video_path)}_{model_version}_crop_{ratio}.csv")
+
+def save_crop_path(path_file, crop_path):
+    """Writes a crop path as CSV, one "frame,x,y,w,h" row per frame."""
+    rows = np.column_stack([np.arange(len(crop_path)), crop_path])
+    temp_path = f"{path_file}.{uuid.uuid4().hex}.tmp"
+    np.savetxt(temp_path, rows, fmt="%d", delimiter=",", header="frame,x,y,w,h", comments="")
+    os.replace(temp_path, path_file)
+    return path_file
+
+def render_crop_path(video_path, output_path, path_file, target_width, target_height, fps, progress=None,
+                     duration=None, preset=None):
+    """Crops a video along a crop path file and scales it to the target size, entirely inside ffmpeg.
+
+    The path's x/y changes are sent to ffmpeg's crop filter with sendcmd, so no
+    frames pass through Python. progress, if given, is called as
+    progress("crop", frames_done, frames_total); duration and preset are passed
+    on to run_ffmpeg_filter.
+    """
+    crop_path = np.loadtxt(path_file, dtype=np.int64, delimiter=",", skiprows=1, ndmin=2)[:, 1:]
+    x, y, width, height = crop_path[0]
+
+    # One command per change of position, timed halfway before the frame so rounding can't delay it
+    commands_path = os.path.join(app.config["TEMP_FOLDER"], f"crop_{uuid.uuid4().hex}.cmd")
+    changed = np.flatnonzero(np.any(np.diff(crop_path[:, :2], axis=0) != 0, axis=1)) + 1
+    with open(commands_path, "w") as f:
+        for i in changed:
+            f.write(f"{(i - 0.5) / fps:.6f} crop x {crop_path[i, 0]}, crop y {crop_path[i, 1]};\n")
+
+    # sendcmd refuses an empty command file, so a crop that never moves goes without it
+    send_commands = f"sendcmd=f='{commands_path}'," if len(changed) else ""
+    video_filter = (
+        f"setpts=PTS-STARTPTS,{send_commands}"
+        f"crop={width}:{height}:{x}:{y},scale={target_width}:{target_height},setsar=1"
+    )
+    try:
+        return run_ffmpeg_filter(video_path, output_path, video_filter, target_width, target_height,
+                                 "crop", progress, duration, preset)
+    finally:
+        os.remove(commands_path)
+
+def detection_index_path(video_path, detect_interval=None):
+    """Returns the sidecar path of a video's detection index.
+
+    The path is keyed on the video's content, the YOLO weights and the settings
+    the analysis depends on: detect_interval (DETECTION_INTERVAL by default),
+    ANALYSIS_WIDTH and SCENE_CUT_DETECTION.
+    """
+    model_version = os.path.splitext(os.path.basename(YOLO_WEIGHTS))[0]
+    settings = f"every{int(detect_interval or app.config['DETECTION_INTERVAL'])}_w{app.config['ANALYSIS_WIDTH']}"
+    if app.config["SCENE_CUT_DETECTION"]:
+        settings += "_cuts"
+    return os.path.join(app.config["CACHE_FOLDER"],
+                        f"{file_content_hash(video_path)}_{model_version}_{settings}_detections.npz")
+
+def load_detection_index(video_path, detect_interval=None):
+    """Returns the stored detections of a video as a dict of arrays, or None if there are none."""
+    index_path = detection_index_path(video_path, detect_interval)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with np.load(index_path) as index:
+            return {name: index[name] for name in index.files}
+    except Exception as e:
+        print(f"Error loading detection index {index_path}: {e}")
+        return None
+
+def save_detection_index(video_path, boxes, confidences, detected, frame_size, detect_interval):
+    """Writes per-frame person boxes and confidences of a video to its sidecar index."""
+    index_path = detection_index_path(video_path, detect_interval)
+    temp_path = f"{index_path[:-4]}_{uuid.uuid4().hex}.npz"
+    np.savez_compressed(
+        temp_path,
+        boxes=np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+        confidences=np.asarray(confidences, dtype=np.float32),
+        detected=np.asarray(detected, dtype=bool),
+        frame_size=np.asarray(frame_size, dtype=np.int32),
+        detect_interval=np.int32(detect_interval)
+    )
+    os.replace(temp_path, index_path)
+    return index_path
+
+def read_proxy_frames(video_path, width, height, max_frames=None):
+    """Yields up to max_frames frames of a video, decoded and scaled to width x height by ffmpeg, as BGR arrays."""
+    cmd = [FFMPEG_BINARY, "-loglevel", "error", "-i", video_path, "-map", "0:v:0", "-fps_mode", "passthrough",
+           "-vf", f"scale={width}:{height}", "-f", "rawvideo", "-pix_fmt", "bgr24"]
+    if max_frames:
+        cmd += ["-frames:v", str(max_frames)]
+    process = subprocess.Popen(cmd + ["-"], stdout=subprocess.PIPE)
+    frame_size = width * height * 3
+    try:
+        while True:
+            data = process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+def analyze_video(video_path, batch_size, detect_interval, cuts=None, max_frames=None, progress=None):
+    """Runs detection and tracking over a video (or its first max_frames frames) without rendering.
+
+    Frames are read from a low-resolution proxy stream (ANALYSIS_WIDTH wide)
+    and the boxes are scaled back to source coordinates. YOLO runs on every
+    detect_interval-th frame of each shot, batch_size frames per call, and the
+    box is tracked in between; cuts are passed on to track_person_boxes. progress, if given, is called as
+    progress("detect", frames_done, frames_total).
+    Returns a dict of arrays with the same keys as a detection index.
+    """
+    probe = probe_video(video_path)
+    frame_width, frame_height, total_frames = probe["width"], probe["height"], probe["frame_count"]
+    if max_frames:
+        total_frames = min(total_frames, max_frames)
+
+    proxy_width = min(frame_width, app.config["ANALYSIS_WIDTH"])
+    proxy_height = max(2, round(frame_height * proxy_width / frame_width / 2) * 2)
+    box_scale = np.array([frame_width / proxy_width, frame_height / proxy_height] * 2, dtype=np.float32)
+
+    boxes = []
+    confidences = []
+    detected_frames = []
+    stop = threading.Event()
+    errors = []
+
+    try:
+        frames = stream_stage(read_proxy_frames(video_path, proxy_width, proxy_height, max_frames), stop, errors)
+        for _, box, confidence, detected in track_person_boxes(frames, detect_interval, batch_size, cuts):
+            boxes.append(box * box_scale)
+            confidences.append(confidence)
+            detected_frames.append(detected)
+            if progress:
+                progress("detect", len(boxes), total_frames)
+    finally:
+        stop.set()
+
+    if errors:
+        raise errors[0]
+
+    return {
+        "boxes": np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+        "confidences": np.asarray(confidences, dtype=np.float32),
+        "detected": np.asarray(detected_frames, dtype=bool),
+        "frame_size": np.asarray((frame_width, frame_height), dtype=np.int32),
+        "detect_interval": np.int32(detect_interval)
+    }
+
+def build_detection_index(video_path, batch_size, detect_interval, progress=None):
+    """Analyses a whole video (see analyze_video) and saves its detection index.
+
+    progress, if given, is called as progress("detect", frames_done, frames_total).
+    Returns the index as a dict of arrays, like load_detection_index. A call made
+    while the same video is being indexed (e.g. by upload pre-analysis) waits for
+    that pass instead of starting another.
+    """
+    def analyze_and_save(progress):
+        progress("detect", 0, probe_video(video_path)["frame_count"])
+        analysis = analyze_video(video_path, batch_size, detect_interval, video_scene_cuts(video_path),
+                                 progress=progress)
+        save_detection_index(video_path, analysis["boxes"], analysis["confidences"], analysis["detected"],
+                             analysis["frame_size"], detect_interval)
+        return load_detection_index(video_path, detect_interval)
+
+    return run_once(("detection_index", detection_index_path(video_path, detect_interval)), analyze_and_save, progress)
+
+def crop_video_to_face(video_path, output_path, aspect_ratio_str, target_width, target_height,
+                       batch_size=None, detect_interval=None, progress=None, parallel=False, captions=None,
+                       engine=None):
+    """Crops the video to follow the detected person and resizes it to target_width x target_height.
+
+    Crop windows come from the video's detection index, built on first use with
+    batch_size and detect_interval (DETECTION_BATCH_SIZE and DETECTION_INTERVAL
+    by default). captions, a list or a Future from start_transcription, are
+    burned in. progress is called as progress("crop", frames_done, frames_total).
+    With the "ffmpeg" engine (RENDER_ENGINE by default), caption-free crops follow
+    a smoothed crop path (see render_crop_path); with parallel=True, long videos
+    are cropped in chunks (see render_chunked). Returns output_path, or None.
+    """
+    if get_model("yolo") is None:
         print("YOLO model not loaded. Face tracking is disabled.")
         return None
 
@@ -139,259 +1502,1485 @@ def crop_video_to_face(video_path, output_path, aspect_ratio_str, target_width,
             aspect_ratio = (16, 9)
 
         target_ratio = aspect_ratio[0] / aspect_ratio[1]
-
-        # Open video
-        cap = cv2.VideoCapture(video_path)
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        # Store cropped frames
-        cropped_frames = []
+        batch_size = batch_size or app.config["DETECTION_BATCH_SIZE"]
+        detect_interval = detect_interval or app.config["DETECTION_INTERVAL"]
+
+        # Video metadata; fps stays exact for the encoder, source_fps is for timestamps
+        probe = probe_video(video_path)
+        fps = probe["fps"]
+        source_fps = float(fps)
+        frame_width, frame_height, total_frames = probe["width"], probe["height"], probe["frame_count"]
+
+        # Reuse stored detections when this video was analysed before
+        index = load_detection_index(video_path, detect_interval)
+        if index is None:
+            index = build_detection_index(video_path, batch_size, detect_interval, progress)
+        windows = compute_crop_windows(index["boxes"], frame_width, frame_height, target_ratio)
+
+        # Join with transcription: captions are needed from here on
+        captions = resolve_captions(captions)
+        overlay = make_caption_overlay(captions, target_width, target_height) if captions else None
+
+        # Shot boundaries: the crop path is smoothed per shot and chunks are split on them
+        cuts = video_scene_cuts(video_path)
+
+        if (engine or app.config["RENDER_ENGINE"]) == "ffmpeg" and not captions:
+            crop_path = smooth_crop_path(windows, frame_width, frame_height, target_ratio, source_fps, cuts)
+            path_file = save_crop_path(crop_path_file(video_path, aspect_ratio), crop_path)
+            return render_crop_path(video_path, output_path, path_file, target_width, target_height,
+                                    source_fps, progress)
+
+        if parallel:
+            chunks = plan_video_chunks(video_path, cuts=cuts)
+            if len(chunks) > 1:
+                options = {"mode": "crop", "width": target_width, "height": target_height, "captions": captions}
+                render_chunked(video_path, output_path, chunks, options, progress, "crop", windows=windows)
+                return output_path
+
+        def crop_frames(frames):
+            for i, frame in enumerate(frames):
+                cropped_frame = crop_frame(frame, windows[min(i, len(windows) - 1)], target_width, target_height)
+                yield overlay(cropped_frame, i / source_fps) if overlay else cropped_frame
+
+        # Same container as the output, so the encoder picks the codec the final mux copies
+        video_only_path = os.path.join(app.config["TEMP_FOLDER"],
+                                       f"video_{uuid.uuid4().hex}{os.path.splitext(output_path)[1]}")
+        stop = threading.Event()
+        errors = []
         frame_count = 0
+        cap = cv2.VideoCapture(video_path)
+        encoder = start_encoder(video_only_path, target_width, target_height, fps)
+
+        # Decode, crop and encode run in their own threads, joined by bounded queues so memory stays flat
+        try:
+            frames = stream_stage(read_frames(cap), stop, errors)
+            cropped_frames = stream_stage(crop_frames(frames), stop, errors)
+            for cropped_frame in cropped_frames:
+                encoder.stdin.write(cropped_frame.tobytes())
+                frame_count += 1
+                if progress:
+                    progress("crop", frame_count, total_frames)
+        finally:
+            stop.set()
+            finish_encoder(encoder)
+            cap.release()
+
+        if errors:
+            raise errors[0]
+
+        if frame_count == 0:
+            print("No frames processed!")
+            os.remove(video_only_path)
+            return None
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break  # Stop if video ends
-
-            frame_count += 1
-
-            # Perform YOLO face detection
-            results = yolo_model(frame)
-
-            # Check if a face is detected
-            face_detected = False
-            for result in results:
-                for box in result.boxes:
-                    if hasattr(box, 'cls') and len(box.cls) > 0 and int(box.cls[0]) == 0:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        face_detected = True
-                        break
-                if face_detected:
-                    break
-
-            if face_detected:
-                # Crop to maintain aspect ratio around the face
-                face_width = x2 - x1
-                face_height = y2 - y1
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-
-                # Adjust crop size to maintain target aspect ratio
-                if target_ratio > (face_width / face_height):
-                    new_width = int(face_height * target_ratio)
-                    new_height = face_height
-                else:
-                    new_width = face_width
-                    new_height = int(face_width / target_ratio)
-
-                # Ensure cropping doesn't exceed frame boundaries
-                x1_new = max(0, center_x - new_width // 2)
-                x2_new = min(frame_width, center_x + new_width // 2)
-                y1_new = max(0, center_y - new_height // 2)
-                y2_new = min(frame_height, center_y + new_height // 2)
-
-                # Crop frame
-                cropped_frame = frame[y1_new:y2_new, x1_new:x2_new]
-
-                # Resize to target dimensions
-                cropped_frame = cv2.resize(cropped_frame, (target_width, target_height))
-                cropped_frame = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2RGB)
-                cropped_frames.append(cropped_frame)
-            else:
-                # Center crop when no face detected
-                current_ratio = frame_width / frame_height
+        # Add audio from original video
+        mux_audio(video_only_path, video_path, output_path)
+        os.remove(video_only_path)
+        return output_path
+    except Exception as e:
+        print(f"Error in face tracking: {e}")
+        return None
 
-                if current_ratio > target_ratio:
-                    new_width = int(frame_height * target_ratio)
-                    start = (frame_width - new_width) // 2
-                    cropped_frame = frame[:, start:start+new_width]
+def render_outputs(video_path, outputs, progress=None):
+    """Decodes a video once and renders several outputs from the same frames.
+
+    outputs is a list of dicts with "output_path", "width", "height", crop
+    "windows" (None to resize the whole frame) and "captions" to burn in
+    (or None). Every output has its own worker thread and encoder, fed from
+    the single decode through a bounded queue, and gets the source audio.
+    progress, if given, is called as progress("render", frames_done, frames_total).
+    """
+    probe = probe_video(video_path)
+    fps = probe["fps"]
+    source_fps = float(fps)
+    total_frames = probe["frame_count"]
+
+    stop = threading.Event()
+    errors = []
+    video_only_paths = [
+        os.path.join(app.config["TEMP_FOLDER"], f"video_{uuid.uuid4().hex}{os.path.splitext(output['output_path'])[1]}")
+        for output in outputs
+    ]
+    encoders = []
+    threads = []
+
+    def render(output, inbox, encoder):
+        try:
+            width, height, windows = output["width"], output["height"], output["windows"]
+            overlay = make_caption_overlay(output["captions"], width, height) if output["captions"] else None
+            for i, frame in enumerate(_queue_iter(inbox, stop)):
+                if windows is not None:
+                    frame = crop_frame(frame, windows[min(i, len(windows) - 1)], width, height)
                 else:
-                    new_height = int(frame_width / target_ratio)
-                    start = (frame_height - new_height) // 2
-                    cropped_frame = frame[start:start+new_height, :]
-
-                # Resize to target dimensions
-                cropped_frame = cv2.resize(cropped_frame, (target_width, target_height))
-                cropped_frame = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2RGB)
-                cropped_frames.append(cropped_frame)
+                    frame = cv2.resize(frame, (width, height))
+                if overlay:
+                    frame = overlay(frame, i / source_fps)
+                encoder.stdin.write(frame.tobytes())
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        inboxes = []
+        for output, video_only_path in zip(outputs, video_only_paths):
+            encoder = start_encoder(video_only_path, output["width"], output["height"], fps)
+            inbox = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+            thread = threading.Thread(target=render, args=(output, inbox, encoder), daemon=True)
+            thread.start()
+            encoders.append(encoder)
+            inboxes.append(inbox)
+            threads.append(thread)
 
+        frame_count = 0
+        for frame in stream_stage(read_frames(cap), stop, errors):
+            for inbox in inboxes:
+                _queue_put(inbox, frame, stop)
+            frame_count += 1
+            if progress:
+                progress("render", frame_count, total_frames)
+        for inbox in inboxes:
+            _queue_put(inbox, _END_OF_STREAM, stop)
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for encoder in encoders:
+            finish_encoder(encoder)
         cap.release()
 
-        if cropped_frames:
-            # Create video clip from cropped frames
-            cropped_video = ImageSequenceClip(cropped_frames, fps=fps)
+    if errors:
+        raise errors[0]
+
+    # Add audio from original video
+    for output, video_only_path in zip(outputs, video_only_paths):
+        mux_audio(video_only_path, video_path, output["output_path"])
+        os.remove(video_only_path)
+    return [output["output_path"] for output in outputs]
+
+def plan_video_chunks(video_path, num_chunks=None, cuts=None):
+    """Splits a video at keyframes into roughly equal [start_frame, end_frame) ranges.
+
+    With cuts (scene cut frame indices), each split moves to the nearest cut
+    within a quarter chunk, so chunks start on a new shot where possible.
+    """
+    num_chunks = num_chunks or app.config["CHUNK_WORKERS"]
+
+    probe = probe_video(video_path)
+    keyframes, frame_count = probe["keyframes"], probe["frame_count"]
+    chunk_length = max(frame_count / num_chunks, MIN_CHUNK_SECONDS * probe["fps"])
+
+    bounds = [0]
+    for keyframe in keyframes:
+        if keyframe - bounds[-1] >= chunk_length and frame_count - keyframe >= chunk_length / 2:
+            bounds.append(keyframe)
+    bounds.append(frame_count)
+
+    for i in range(1, len(bounds) - 1):
+        nearby = [cut for cut in cuts or [] if abs(cut - bounds[i]) <= chunk_length / 4 and bounds[i - 1] < cut]
+        if nearby:
+            bounds[i] = min(nearby, key=lambda cut: abs(cut - bounds[i]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def read_frame_range(cap, start_frame, end_frame):
+    """Yields frames [start_frame, end_frame) from an open cv2.VideoCapture."""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    for index, frame in enumerate(read_frames(cap), start_frame):
+        if index >= end_frame:
+            break
+        yield frame
+
+def render_chunk(task):
+    """Renders one chunk of a video into a video-only file.
+
+    Runs in a worker process and returns {"frames": frames written}. Crop
+    chunks take their per-frame crop windows from task["windows"].
+    """
+    cap = cv2.VideoCapture(task["video_path"])
+    fps = task["fps"]
+    source_fps = float(fps)
+    start_frame, end_frame = task["start_frame"], task["end_frame"]
+    encoder = start_encoder(task["chunk_path"], task["width"], task["height"], fps, threads=task["threads"])
+    result = {"frames": 0}
+
+    overlay = None
+    if task.get("captions"):
+        overlay = make_caption_overlay(task["captions"], task["width"], task["height"])
+
+    def write_frame(frame):
+        if overlay:
+            frame = overlay(frame, (start_frame + result["frames"]) / source_fps)
+        encoder.stdin.write(frame.tobytes())
+        result["frames"] += 1
 
-            # Add audio from original video
-            orig_clip = VideoFileClip(video_path)
-            if orig_clip.audio:
-                cropped_video = cropped_video.set_audio(orig_clip.audio)
-
-            # Write output
-            cropped_video.write_videofile(output_path, codec="libx264", audio_codec="aac")
-            return output_path
+    try:
+        if task["mode"] == "crop":
+            windows = task["windows"]
+            for i, frame in enumerate(read_frame_range(cap, start_frame, end_frame)):
+                write_frame(crop_frame(frame, windows[min(i, len(windows) - 1)], task["width"], task["height"]))
         else:
-            print("No frames processed!")
-            return None
-    except Exception as e:
-        print(f"Error in face tracking: {e}")
-        return None
+            for frame in read_frame_range(cap, start_frame, end_frame):
+                write_frame(cv2.resize(frame, (task["width"], task["height"])))
+    finally:
+        finish_encoder(encoder)
+        cap.release()
+
+    return result
+
+def concat_chunks(chunk_paths, audio_source_path, output_path):
+    """Joins video-only chunks with the ffmpeg concat demuxer (no re-encode) and adds the source audio."""
+    list_path = os.path.join(os.path.dirname(chunk_paths[0]), "chunks.txt")
+    with open(list_path, "w") as f:
+        for chunk_path in chunk_paths:
+            f.write(f"file '{os.path.abspath(chunk_path)}'\n")
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_source_path,
+        "-map", "0:v:0", "-map", "1:a:0?",
+        "-c:v", "copy", "-c:a", output_codecs(output_path)[1], "-shortest",
+        *muxer_options(output_path),
+        output_path,
+    ]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+def render_chunked(video_path, output_path, chunks, options, progress=None, stage="render", windows=None):
+    """Renders video chunks in a process pool and joins them losslessly into output_path.
+
+    options holds the per-frame operation for render_chunk ("resize" or "crop"
+    and its parameters); windows, if given, are precomputed crop windows for
+    every frame and are sliced per chunk. progress is called with frames done /
+    total as chunks finish. Returns the render_chunk results in chunk order.
+    """
+    workers = min(len(chunks), app.config["CHUNK_WORKERS"])
+    # Share the cores between the chunk encoders instead of each using all of them
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Probed here so workers in other processes don't have to re-read the file
+    fps = probe_video(video_path)["fps"]
+    chunk_dir = tempfile.mkdtemp(prefix="chunks_", dir=app.config["TEMP_FOLDER"])
+    tasks = [
+        dict(
+            options,
+            video_path=video_path,
+            chunk_path=os.path.join(chunk_dir, f"chunk_{i:04d}{os.path.splitext(output_path)[1]}"),
+            start_frame=start_frame,
+            end_frame=end_frame,
+            fps=fps,
+            threads=threads,
+            windows=windows[start_frame:end_frame] if windows is not None else None
+        )
+        for i, (start_frame, end_frame) in enumerate(chunks)
+    ]
+    total_frames = chunks[-1][1]
+    frames_done = 0
 
-def extract_audio(video_path, audio_path="temp_audio.wav"):
-    """Extracts audio from a video file."""
     try:
-        clip = mp.VideoFileClip(video_path)
-        if clip.audio:
-            clip.audio.write_audiofile(audio_path)
-            return audio_path
-        return None
+        # spawn rather than fork: the parent holds model and worker threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(render_chunk, task) for task in tasks]
+            try:
+                for future in as_completed(futures):
+                    frames_done += future.result()["frames"]
+                    if progress:
+                        progress(stage, frames_done, total_frames)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        concat_chunks([task["chunk_path"] for task in tasks], video_path, output_path)
+        return [future.result() for future in futures]
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+# Whisper expects 16 kHz mono float32 audio
+WHISPER_SAMPLE_RATE = 16000
+
+def extract_audio(video_path):
+    """Decodes the first audio track of a video into a 16 kHz mono float32 array, or None if there is none."""
+    try:
+        if probe_video(video_path)["audio_codec"] is None:
+            return None
+        cmd = [
+            FFMPEG_BINARY, "-loglevel", "error", "-i", video_path,
+            "-map", "0:a:0", "-vn",
+            "-f", "f32le", "-ac", "1", "-ar", str(WHISPER_SAMPLE_RATE),
+            "-",
+        ]
+        result = subprocess.run(cmd, capture_output=True)
+        if result.returncode != 0 or not result.stdout:
+            return None
+        return np.frombuffer(result.stdout, dtype=np.float32)
     except Exception as e:
         print(f"Error extracting audio: {e}")
         return None
 
+def transcript_cache_path(audio):
+    """Returns the cache path of the transcript for an audio buffer and the Whisper model."""
+    audio_hash = hashlib.sha256(audio.tobytes()).hexdigest()
+    return os.path.join(app.config["CACHE_FOLDER"], f"{audio_hash}_whisper-{WHISPER_MODEL}_transcript.json")
+
+def video_transcript_cache_path(video_path):
+    """Returns the cache path of the transcript of a video's content, alongside the per-audio transcripts."""
+    return os.path.join(app.config["CACHE_FOLDER"],
+                        f"{file_content_hash(video_path)}_whisper-{WHISPER_MODEL}_video_transcript.json")
+
+def transcribe_audio(audio):
+    """Returns Whisper segments for an audio buffer, reusing a cached transcript of identical audio."""
+    cache_path = transcript_cache_path(audio)
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    result = get_model("whisper").transcribe(audio)
+    segments = [
+        {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+        for segment in result["segments"]
+    ]
+
+    save_json(cache_path, segments)
+    return segments
+
 def generate_captions(video_path):
     """Generates captions using the Whisper STT model."""
-    if stt_model is None:
+    if get_model("whisper") is None:
         return "Captions not available. Whisper model not loaded."
 
     try:
-        audio_path = extract_audio(video_path)
-        if audio_path:
-            result = stt_model.transcribe(audio_path)
-            os.remove(audio_path)
-
-            captions = []
-            for segment in result["segments"]:
-                start_time = segment["start"]
-                end_time = segment["end"]
-                text = segment["text"]
-                captions.append(((start_time, end_time), text))
-
-            return captions
-        return "No audio detected", None
+        # A video transcribed before (e.g. by upload pre-analysis) skips the audio decode too
+        cache_path = video_transcript_cache_path(video_path)
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                segments = json.load(f)
+        else:
+            audio = extract_audio(video_path)
+            if audio is None:
+                return "No audio detected", None
+            segments = transcribe_audio(audio)
+            save_json(cache_path, segments)
+
+        captions = []
+        for segment in segments:
+            start_time = segment["start"]
+            end_time = segment["end"]
+            text = segment["text"]
+            captions.append(((start_time, end_time), text))
+
+        return captions
     except Exception as e:
         print(f"Error generating captions: {e}")
         return "Error generating captions", None
 
-def overlay_captions(video_path, captions, output_path):
-    """Overlays captions on the video."""
+# Caption fonts tried in order before falling back to Pillow's built-in font
+CAPTION_FONTS = ["Cantarell-Regular.otf", "Cantarell-VF.otf", "DejaVuSans.ttf", "Arial.ttf"]
+
+# Whisper runs on its own thread so it overlaps with video processing. One
+# transcription at a time: the model installs per-call hooks and isn't safe
+# to share between threads.
+_transcription_executor = ThreadPoolExecutor(max_workers=1)
+
+def start_transcription(video_path, progress=None):
+    """Starts generate_captions on the transcription thread and returns a Future of its result."""
+    def transcribe():
+        if progress:
+            progress("transcribe", 0, 1)
+        captions = generate_captions(video_path)
+        if progress:
+            progress("transcribe", 1, 1)
+        return captions
+
+    return _transcription_executor.submit(transcribe)
+
+def resolve_captions(captions):
+    """Returns a caption list, waiting for a pending transcription; None when there are no captions."""
+    if isinstance(captions, Future):
+        captions = captions.result()
+    if not isinstance(captions, list) or not captions:
+        return None
+    return captions
+
+def load_caption_font(font_size):
+    """Returns the first available caption font at the given size."""
+    for font_name in CAPTION_FONTS:
+        try:
+            return ImageFont.truetype(font_name, font_size)
+        except OSError:
+            continue
+    return ImageFont.load_default(font_size)
+
+def wrap_caption_text(draw, text, font, max_width):
+    """Splits caption text into lines that fit within max_width pixels."""
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and draw.textlength(candidate, font=font) > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+def rasterize_caption(text, font_size, box_width):
+    """Renders a caption into a premultiplied RGB bitmap and its inverse alpha, both float32.
+
+    The caption is centered white text on a 70% opaque black box box_width
+    pixels wide, as tall as the wrapped text needs.
+    """
+    font = load_caption_font(font_size)
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    padding = font_size // 3
+    lines = wrap_caption_text(measure, text, font, box_width - 2 * padding) or [""]
+    line_height = int(font_size * 1.25)
+    box_height = line_height * len(lines) + 2 * padding
+
+    image = Image.new("RGBA", (box_width, box_height), (0, 0, 0, int(255 * 0.7)))
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        x = (box_width - draw.textlength(line, font=font)) / 2
+        draw.text((x, padding + i * line_height), line, font=font, fill=(255, 255, 255, 255))
+
+    bitmap = np.asarray(image, dtype=np.float32)
+    alpha = bitmap[..., 3:] / 255
+    return bitmap[..., :3] * alpha, 1 - alpha
+
+def make_caption_overlay(captions, width, height):
+    """Returns overlay(frame, t) that burns the caption active at time t into a width x height frame.
+
+    Each caption is rasterized once, on first use, and alpha-blended onto
+    only the rows and columns it covers. Captions are white on black, so
+    the frame may be either RGB or BGR. Frames without an active caption
+    are returned unchanged.
+    """
+    is_portrait = height > width
+    base_font_size = 30
+    font_size = base_font_size * (2 if is_portrait else 1)
+    subtitle_margin = 300 if is_portrait else 50
+    subtitle_width = int(width * 0.8)
+
+    captions = sorted(captions, key=lambda caption: caption[0][0])
+    starts = [start for (start, _), _ in captions]
+    bitmaps = {}
+
+    def overlay(frame, t):
+        i = bisect.bisect_right(starts, t) - 1
+        if i < 0 or t >= captions[i][0][1]:
+            return frame
+
+        if i not in bitmaps:
+            bitmaps[i] = rasterize_caption(captions[i][1].strip(), font_size, subtitle_width)
+        premultiplied, inverse_alpha = bitmaps[i]
+
+        # Clip the caption box to the frame
+        frame_height, frame_width = frame.shape[:2]
+        box_height, box_width = inverse_alpha.shape[:2]
+        x = (frame_width - box_width) // 2
+        y = height - subtitle_margin
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + box_width, frame_width), min(y + box_height, frame_height)
+        if x1 <= x0 or y1 <= y0:
+            return frame
+
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        region = frame[y0:y1, x0:x1]
+        region[:] = (
+            premultiplied[y0 - y:y1 - y, x0 - x:x1 - x]
+            + region * inverse_alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+        ).astype(np.uint8)
+        return frame
+
+    return overlay
+
+# How auto captions are delivered: burned into the frames (re-encodes), written as .srt/.vtt
+# sidecar files, or muxed into the output as a subtitle track (streams copied)
+CAPTION_MODES = ("burn", "sidecar", "track")
+
+# Subtitle codec per container for caption_mode "track"; other containers get sidecar files
+SUBTITLE_CODECS = {"mp4": "mov_text", "mov": "mov_text", "webm": "webvtt", "mkv": "srt"}
+
+def format_subtitle_timestamp(seconds, decimal_separator):
+    """Formats seconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT)."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_separator}{milliseconds:03d}"
+
+def write_subtitles(captions, subtitle_path):
+    """Writes ((start, end), text) captions as an SRT or WebVTT file, picked by the file extension."""
+    webvtt = subtitle_path.endswith(".vtt")
+    with open(subtitle_path, "w", encoding="utf-8") as f:
+        if webvtt:
+            f.write("WEBVTT\n\n")
+        for number, ((start_time, end_time), text) in enumerate(captions, 1):
+            if not webvtt:
+                f.write(f"{number}\n")
+            separator = "." if webvtt else ","
+            f.write(f"{format_subtitle_timestamp(start_time, separator)} --> "
+                    f"{format_subtitle_timestamp(end_time, separator)}\n{text.strip()}\n\n")
+    return subtitle_path
+
+def mux_subtitles(video_path, subtitle_path, subtitle_codec):
+    """Adds a subtitle file to a video as a subtitle stream in place, copying the existing streams."""
+    temp_path = f"{os.path.splitext(video_path)[0]}_{uuid.uuid4().hex}{os.path.splitext(video_path)[1]}"
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-i", video_path, "-i", subtitle_path,
+        "-map", "0", "-map", "1:0",
+        "-c", "copy", "-c:s", subtitle_codec,
+        *muxer_options(video_path),
+        temp_path,
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(temp_path, video_path)
+    return video_path
+
+def attach_subtitles(output_path, captions, caption_mode):
+    """Delivers captions for a rendered output without re-encoding it; returns the extra result fields.
+
+    "track" muxes them into the output as a subtitle stream. "sidecar" (and
+    "track" for containers without subtitle support) writes .srt and .vtt
+    files next to the output.
+    """
+    base_path, extension = os.path.splitext(output_path)
+    container = extension.lstrip(".").lower()
+    if caption_mode == "track" and container in SUBTITLE_CODECS:
+        subtitle_path = write_subtitles(captions, f"{base_path}_{uuid.uuid4().hex}.srt")
+        try:
+            mux_subtitles(output_path, subtitle_path, SUBTITLE_CODECS[container])
+        finally:
+            os.remove(subtitle_path)
+        return {}
+
+    return {"subtitle_paths": [write_subtitles(captions, f"{base_path}.srt"),
+                               write_subtitles(captions, f"{base_path}.vtt")]}
+
+def parse_time_range(data):
+    """Returns the requested (start, end) seconds (either may be None), or None to process the whole video."""
+    start, end = data.get("start"), data.get("end")
+    if start is None and end is None:
+        return None
+    start = float(start) if start is not None else None
+    end = float(end) if end is not None else None
+    if (start is not None and start < 0) or (end is not None and end <= (start or 0)):
+        raise ValueError("start must be >= 0 and end must be after start")
+    return start, end
+
+def extract_clip(video_path, start=None, end=None, progress=None):
+    """Cuts the [start, end) seconds of a video into a temporary lossless clip and returns its path.
+
+    With -ss before -i, ffmpeg seeks to the keyframe preceding start and drops
+    the decoded frames before it, so the cut is frame accurate and only the
+    requested range (plus at most one GOP) is decoded. Video is kept as
+    lossless H.264 and audio as PCM, so the clip adds no generation loss.
+    Cached detections, scene cuts and transcript of the source carry over to
+    the clip (see slice_source_analysis).
+    progress, if given, is called as progress("trim", done, 1).
+    """
+    if progress:
+        progress("trim", 0, 1)
+    clip_path = os.path.join(app.config["TEMP_FOLDER"], f"clip_{uuid.uuid4().hex}.mkv")
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+    if start:
+        cmd += ["-ss", str(start)]
+    cmd += ["-i", video_path]
+    if end is not None:
+        cmd += ["-t", str(end - (start or 0))]
+    cmd += [
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "libx264", "-qp", "0", "-preset", "ultrafast", "-c:a", "pcm_s16le",
+        clip_path,
+    ]
+    subprocess.run(cmd, check=True)
     try:
-        clip = mp.VideoFileClip(video_path)
-        original_width, original_height = clip.size
-
-        is_portrait = original_height > original_width
-        base_font_size = 30
-        subtitle_margin = 300 if is_portrait else 50
-        subtitle_width = int(original_width * 0.8)
-
-        def create_subtitle_text_clip(txt):
-            return mp.TextClip(
-                txt,
-                font='Cantarell',
-                fontsize=base_font_size * (2 if is_portrait else 1),
-                color='white',
-                bg_color='black',
-                size=(subtitle_width, None),
-                method='caption',
-                align='center'
-            ).on_color(
-                color=(0, 0, 0, int(255 * 0.7)),
-                col_opacity=0.7
-            )
-
-        subtitles = SubtitlesClip(captions, create_subtitle_text_clip)
-        subtitle_position = ('center', original_height - subtitle_margin)
+        slice_source_analysis(video_path, clip_path, start or 0)
+    except Exception as e:
+        print(f"Error reusing the analysis of {video_path}: {e}")
+    if progress:
+        progress("trim", 1, 1)
+    return clip_path
+
+def slice_source_analysis(video_path, clip_path, start):
+    """Seeds a clip's analysis caches from those of the video it was cut from, starting start seconds in.
+
+    The clip has a content hash of its own, so its detection index, scene cuts
+    and transcript would otherwise be computed again. The source's boxes and
+    cuts are sliced by frame offset and its transcript by time; analysis the
+    source doesn't have yet is left to the clip's own run.
+    """
+    probe = probe_video(video_path)
+    clip_probe = probe_video(clip_path)
+    # The clip starts at the first frame at or after start
+    start_frame = math.ceil(start * float(probe["fps"]) - 1e-6)
+    end_frame = start_frame + clip_probe["frame_count"]
+
+    index = load_detection_index(video_path)
+    if index is not None and len(index["boxes"]) > start_frame:
+        save_detection_index(clip_path, index["boxes"][start_frame:end_frame],
+                             index["confidences"][start_frame:end_frame], index["detected"][start_frame:end_frame],
+                             index["frame_size"], index["detect_interval"])
+
+    if app.config["SCENE_CUT_DETECTION"] and os.path.exists(scene_cuts_path(video_path)):
+        cuts = detect_scene_cuts(video_path)
+        save_json(scene_cuts_path(clip_path), [cut - start_frame for cut in cuts if start_frame < cut < end_frame])
+
+    transcript_path = video_transcript_cache_path(video_path)
+    if os.path.exists(transcript_path):
+        with open(transcript_path) as f:
+            segments = json.load(f)
+        end = start + clip_probe["duration"]
+        save_json(video_transcript_cache_path(clip_path), [
+            {"start": max(segment["start"] - start, 0), "end": min(segment["end"], end) - start,
+             "text": segment["text"]}
+            for segment in segments if segment["end"] > start and segment["start"] < end
+        ])
+
+def run_on_time_range(run, data, progress=None):
+    """Calls run(data, progress) on just the requested start/end range of the input video, if one was requested."""
+    time_range = parse_time_range(data)
+    if time_range is None:
+        return run(data, progress)
+
+    clip_path = extract_clip(data.get("file_path"), *time_range, progress=progress)
+    try:
+        return run(dict(data, file_path=clip_path, start=None, end=None), progress)
+    finally:
+        os.remove(clip_path)
+
+def target_dimensions(video_path, aspect_ratio_str, resolution_percentage):
+    """Returns the (width, height) of the output: the scaled source width and the aspect ratio's height."""
+    # Get original dimensions
+    probe = probe_video(video_path)
+    original_width, original_height = probe["width"], probe["height"]
+
+    # Parse aspect ratio and calculate target dimensions
+    aspect_ratio = parse_aspect_ratio(aspect_ratio_str)
+    new_width = int(original_width * resolution_percentage)
+    if aspect_ratio:
+        ratio_w, ratio_h = aspect_ratio
+        new_height = int(new_width * ratio_h / ratio_w)
+    else:
+        new_height = int(original_height * resolution_percentage)
+    return new_width, new_height
+
+def run_preview(data):
+    """Renders a quick low-resolution preview of a /process_video request.
+
+    Only the first PREVIEW_SECONDS (of the start/end range, if given) are rendered, scaled to fit PREVIEW_MAX_SIZE,
+    through ffmpeg with the ultrafast x264 preset. Face tracking takes its boxes
+    from the cached detection index when there is one and otherwise analyses
+    just the previewed frames. Captions are left out. Previews live in the
+    result cache, so identical requests reuse the preview already rendered
+    and old previews are evicted with the other outputs.
+    """
+    cache_key = preview_cache_key(data)
+    cached_result = lookup_cached_result(cache_key)
+    if cached_result:
+        return cached_result
+
+    output_path = os.path.join(app.config["OUTPUT_FOLDER"], f"preview_{cache_key[:32]}.mp4")
+    # Only cut out what the preview shows
+    time_range = parse_time_range(data)
+    if time_range is not None:
+        start = time_range[0] or 0
+        end = min(time_range[1] or math.inf, start + app.config["PREVIEW_SECONDS"])
+        clip_path = extract_clip(data.get("file_path"), start, end)
+        try:
+            result = render_preview(dict(data, file_path=clip_path), output_path)
+        finally:
+            os.remove(clip_path)
+    else:
+        result = render_preview(data, output_path)
+
+    store_cached_result(cache_key, result)
+    return result
+
+def render_preview(data, output_path):
+    """Renders the preview described by run_preview into output_path."""
+    video_path = data.get("file_path")
+    aspect_ratio_str = data.get("aspect_ratio", "16:9")
+    resolution_percentage = float(data.get("resolution", "100%").replace("%", "")) / 100.0
+    use_face_tracking = data.get("use_face_tracking", False) and get_model("yolo") is not None
+
+    target_width, target_height = target_dimensions(video_path, aspect_ratio_str, resolution_percentage)
+    scale = min(1.0, app.config["PREVIEW_MAX_SIZE"] / max(target_width, target_height))
+    preview_width = max(2, int(target_width * scale) // 2 * 2)
+    preview_height = max(2, int(target_height * scale) // 2 * 2)
+    duration = app.config["PREVIEW_SECONDS"]
+    temp_path = os.path.join(app.config["TEMP_FOLDER"], f"preview_{uuid.uuid4().hex}.mp4")
+
+    if use_face_tracking:
+        probe = probe_video(video_path)
+        fps = float(probe["fps"])
+        frame_width, frame_height = probe["width"], probe["height"]
+        preview_frames = math.ceil(duration * fps)
+
+        aspect_ratio = parse_aspect_ratio(aspect_ratio_str) or (16, 9)
+        target_ratio = aspect_ratio[0] / aspect_ratio[1]
+        # Only scene cuts that are already known; scanning the whole video would blow the latency budget
+        cuts = detect_scene_cuts(video_path) if os.path.exists(scene_cuts_path(video_path)) else None
+        index = load_detection_index(video_path)
+        if index is None:
+            index = analyze_video(video_path, app.config["DETECTION_BATCH_SIZE"], app.config["DETECTION_INTERVAL"],
+                                  cuts, max_frames=preview_frames)
+        windows = compute_crop_windows(index["boxes"][:preview_frames], frame_width, frame_height, target_ratio)
+        crop_path = smooth_crop_path(windows, frame_width, frame_height, target_ratio, fps, cuts)
+
+        path_file = save_crop_path(os.path.join(app.config["TEMP_FOLDER"], f"crop_{uuid.uuid4().hex}.csv"), crop_path)
+        try:
+            render_crop_path(video_path, temp_path, path_file, preview_width, preview_height, fps,
+                             duration=duration, preset="ultrafast")
+        finally:
+            os.remove(path_file)
+    else:
+        run_ffmpeg_filter(video_path, temp_path, f"scale={preview_width}:{preview_height},setsar=1",
+                          preview_width, preview_height, "preview", duration=duration, preset="ultrafast")
+
+    os.replace(temp_path, output_path)
+    return {"output_path": output_path, "preview": True}
+
+def run_process_video(data, progress=None):
+    """Runs the resize/crop and caption pipeline for one request and returns the result.
+
+    With "start"/"end" (seconds), only that range of the video is processed.
+    """
+    if parse_time_range(data) is not None:
+        return run_on_time_range(run_process_video, data, progress)
+
+    video_path = data.get("file_path")
+    format_type = data.get("format", "mp4")
+    aspect_ratio_str = data.get("aspect_ratio", "16:9")
+    auto_caption = data.get("auto_caption", False)
+    resolution_str = data.get("resolution", "100%")
+    use_face_tracking = data.get("use_face_tracking", False)
+    parallel = data.get("parallel", app.config["PARALLEL_RENDER"])
+    caption_mode = data.get("caption_mode", "burn")
+    if caption_mode not in CAPTION_MODES:
+        raise ValueError(f"Unknown caption_mode: {caption_mode}")
+
+    # Calculate resolution percentage and target dimensions
+    resolution_percentage = float(resolution_str.replace("%", "")) / 100.0
+    target_width, target_height = target_dimensions(video_path, aspect_ratio_str, resolution_percentage)
+
+    # Generate output path
+    output_filename = f"output_{uuid.uuid4().hex}.{format_type}"
+    output_path = os.path.join(app.config["OUTPUT_FOLDER"], output_filename)
+
+    # Transcribe alongside the video stage (Whisper loads in that thread if it isn't ready yet);
+    # the render joins it when burning captions in, otherwise they are added once it's done
+    captions = None
+    if auto_caption and model_usable("whisper"):
+        captions = start_transcription(video_path, progress)
+    burned_captions = captions if caption_mode == "burn" else None
+
+    processed_path = None
+
+    if use_face_tracking and get_model("yolo") is not None:
+        processed_path = crop_video_to_face(
+            video_path,
+            output_path,
+            aspect_ratio_str,
+            target_width,
+            target_height,
+            progress=progress,
+            parallel=parallel,
+            captions=burned_captions,
+            engine=data.get("engine")
+        )
+    else:
+        processed_path = resize_video(
+            video_path,
+            output_path,
+            aspect_ratio_str,
+            resolution_percentage * 100,
+            progress=progress,
+            parallel=parallel,
+            captions=burned_captions,
+            engine=data.get("engine")
+        )
+
+    if not processed_path:
+        if captions is not None:
+            captions.cancel()
+        raise RuntimeError("Failed to process video")
+
+    result = {"output_path": processed_path}
+    if burned_captions is None and resolve_captions(captions):
+        result.update(attach_subtitles(processed_path, resolve_captions(captions), caption_mode))
+    return result
+
+def batch_output_specs(data):
+    """Returns one /process_video-style request per entry of a batch request's "outputs"."""
+    shared = {key: value for key, value in data.items() if key != "outputs"}
+    return [dict(shared, **output) for output in data["outputs"]]
+
+def run_process_batch(data, progress=None):
+    """Renders every output of a batch request from one decode, detection and transcription pass.
+
+    Outputs already in the result cache are reused rather than rendered again.
+    "start"/"end" (seconds) apply to every output and limit processing to that range.
+    Returns {"outputs": [result, ...]} with one /process_video result per output, in order.
+    """
+    specs = batch_output_specs(data)
+    results = [lookup_cached_result(batch_output_cache_key(spec)) for spec in specs]
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not pending:
+        return {"outputs": results}
+
+    if parse_time_range(data) is not None:
+        rendered = run_on_time_range(
+            run_process_batch, dict(data, outputs=[data["outputs"][i] for i in pending]), progress
+        )
+        for i, result in zip(pending, rendered["outputs"]):
+            results[i] = result
+        return {"outputs": results}
+
+    video_path = data.get("file_path")
+
+    use_face_tracking = any(specs[i].get("use_face_tracking") for i in pending) and get_model("yolo") is not None
+    auto_caption = any(specs[i].get("auto_caption") for i in pending) and model_usable("whisper")
+
+    # Transcribe alongside the analysis pass; the render joins it when compositing captions
+    captions = start_transcription(video_path, progress) if auto_caption else None
+    try:
+        probe = probe_video(video_path)
+        frame_width, frame_height = probe["width"], probe["height"]
+
+        # One detection index serves every aspect ratio
+        index = None
+        if use_face_tracking:
+            index = load_detection_index(video_path)
+            if index is None:
+                index = build_detection_index(video_path, app.config["DETECTION_BATCH_SIZE"],
+                                              app.config["DETECTION_INTERVAL"], progress)
+
+        captions = resolve_captions(captions)
+        outputs = []
+        for i in pending:
+            spec = specs[i]
+            aspect_ratio_str = spec.get("aspect_ratio", "16:9")
+            resolution_percentage = float(spec.get("resolution", "100%").replace("%", "")) / 100.0
+            width, height = target_dimensions(video_path, aspect_ratio_str, resolution_percentage)
+
+            burn_captions = spec.get("auto_caption") and spec.get("caption_mode", "burn") == "burn"
+            windows = None
+            if use_face_tracking and spec.get("use_face_tracking"):
+                aspect_ratio = parse_aspect_ratio(aspect_ratio_str) or (16, 9)
+                windows = compute_crop_windows(index["boxes"], frame_width, frame_height,
+                                               aspect_ratio[0] / aspect_ratio[1])
+
+            output_filename = f"output_{uuid.uuid4().hex}.{spec.get('format', 'mp4')}"
+            outputs.append({
+                "output_path": os.path.join(app.config["OUTPUT_FOLDER"], output_filename),
+                "width": width,
+                "height": height,
+                "windows": windows,
+                "captions": captions if burn_captions else None
+            })
+
+        render_outputs(video_path, outputs, progress)
+    except BaseException:
+        if isinstance(captions, Future):
+            captions.cancel()
+        raise
+
+    for i, output in zip(pending, outputs):
+        results[i] = {"output_path": output["output_path"]}
+        caption_mode = specs[i].get("caption_mode", "burn")
+        if captions and specs[i].get("auto_caption") and caption_mode != "burn":
+            results[i].update(attach_subtitles(output["output_path"], captions, caption_mode))
+    return {"outputs": results}
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once cancellation was requested."""
+
+# Job IDs waiting to be claimed by a worker thread (the database is the source of truth)
+_pending_job_ids = queue.Queue()
+_job_workers = []
+_job_workers_lock = threading.Lock()
+
+# Identifies this process in the jobs it claims, since a restarted server often gets the same PID
+WORKER_TOKEN = uuid.uuid4().hex
+
+# Minimum number of seconds between progress writes for a running job
+JOB_PROGRESS_INTERVAL = 0.5
+
+def jobs_db_fetch(query, params=()):
+    """Runs a query against the jobs database and returns all rows."""
+    conn = sqlite3.connect(app.config["JOBS_DB"], timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+def jobs_db_execute(query, params=()):
+    """Runs a statement against the jobs database and returns the number of rows changed."""
+    conn = sqlite3.connect(app.config["JOBS_DB"], timeout=30)
+    try:
+        with conn:
+            return conn.execute(query, params).rowcount
+    finally:
+        conn.close()
+
+def init_jobs_db():
+    """Creates the jobs table if it doesn't exist yet."""
+    jobs_db_execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            params TEXT NOT NULL,
+            stage TEXT,
+            progress TEXT NOT NULL DEFAULT '{}',
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            worker_pid INTEGER,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+    # Identical requests share one job doing the work. Every request still gets its own row: the
+    # first one is the shared job, later ones are 'attached' rows pointing at it (shared_job_id).
+    # refs counts the requests of a shared job that haven't been cancelled (detached).
+    columns = {row["name"] for row in jobs_db_fetch("PRAGMA table_info(jobs)")}
+    for column, definition in [("cache_key", "TEXT"), ("shared_job_id", "TEXT"),
+                               ("refs", "INTEGER NOT NULL DEFAULT 1"), ("detached", "INTEGER NOT NULL DEFAULT 0"),
+                               ("worker_token", "TEXT")]:
+        if column not in columns:
+            jobs_db_execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    # At most one live job per cache key; one that is being cancelled doesn't block a new one
+    jobs_db_execute("DROP INDEX IF EXISTS jobs_active_cache_key")
+    jobs_db_execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_live_cache_key
+        ON jobs (cache_key) WHERE status IN ('queued', 'running') AND cancel_requested = 0
+    """)
+
+    # The token of the process currently running under each PID; a running job whose
+    # (worker_pid, worker_token) isn't listed here was left behind by a process that is gone
+    jobs_db_execute("""
+        CREATE TABLE IF NOT EXISTS job_workers (
+            pid INTEGER PRIMARY KEY,
+            token TEXT NOT NULL
+        )
+    """)
+
+    jobs_db_execute("""
+        CREATE TABLE IF NOT EXISTS result_cache (
+            key TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            output_path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+
+init_jobs_db()
+
+def result_cache_key(data):
+    """Returns the cache key for a /process_video request: input content hash plus normalized settings."""
+    aspect_ratio_str = data.get("aspect_ratio", "16:9")
+    aspect_ratio = parse_aspect_ratio(aspect_ratio_str)
+    if aspect_ratio:
+        divisor = math.gcd(*aspect_ratio) or 1
+        aspect_ratio_str = f"{aspect_ratio[0] // divisor}:{aspect_ratio[1] // divisor}"
+
+    settings = {
+        "input": file_content_hash(data.get("file_path")),
+        "aspect_ratio": aspect_ratio_str,
+        "resolution": float(data.get("resolution", "100%").replace("%", "")),
+        "format": data.get("format", "mp4").lower(),
+        # Features whose model failed to load fall back to the plain path, so key on what actually runs
+        "use_face_tracking": bool(data.get("use_face_tracking", False)) and model_usable("yolo"),
+        "auto_caption": bool(data.get("auto_caption", False)) and model_usable("whisper")
+    }
+    if settings["auto_caption"] and data.get("caption_mode", "burn") != "burn":
+        settings["caption_mode"] = data["caption_mode"]
+
+    # Rendering and analysis settings that change the output frames
+    settings["engine"] = data.get("engine") or app.config["RENDER_ENGINE"]
+    settings["parallel"] = bool(data.get("parallel", app.config["PARALLEL_RENDER"]))
+    if settings["parallel"]:
+        settings["chunk_workers"] = app.config["CHUNK_WORKERS"]
+    if settings["use_face_tracking"]:
+        settings["detection"] = {
+            "interval": app.config["DETECTION_INTERVAL"],
+            "analysis_width": app.config["ANALYSIS_WIDTH"],
+            "scene_cuts": app.config["SCENE_CUT_DETECTION"]
+        }
+    if parse_time_range(data) is not None:
+        settings["time_range"] = parse_time_range(data)
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def batch_output_cache_key(spec):
+    """Returns the result cache key of one batch output, which render_outputs renders whatever its engine."""
+    return result_cache_key(dict(spec, engine="batch", parallel=False))
+
+def preview_cache_key(data):
+    """Returns the result cache key of a /preview request: the /process_video key plus the preview settings."""
+    settings = {
+        "request": result_cache_key(data),
+        "preview_seconds": app.config["PREVIEW_SECONDS"],
+        "preview_max_size": app.config["PREVIEW_MAX_SIZE"]
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def lookup_cached_result(cache_key):
+    """Returns the cached result for a key, or None. Entries whose output file is gone are dropped."""
+    rows = jobs_db_fetch("SELECT result, output_path FROM result_cache WHERE key = ?", (cache_key,))
+    if not rows:
+        return None
+    if not os.path.exists(rows[0]["output_path"]):
+        jobs_db_execute("DELETE FROM result_cache WHERE key = ?", (cache_key,))
+        return None
 
-        final_clip = mp.CompositeVideoClip([clip, subtitles.set_position(subtitle_position)])
-        final_clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
+    jobs_db_execute("UPDATE result_cache SET last_used = ? WHERE key = ?", (time.time(), cache_key))
+    return json.loads(rows[0]["result"])
+
+def store_cached_result(cache_key, result):
+    """Adds a finished result to the cache and evicts least recently used outputs over the size limit."""
+    output_path = result["output_path"]
+    jobs_db_execute(
+        "INSERT OR REPLACE INTO result_cache (key, result, output_path, size, last_used) VALUES (?, ?, ?, ?, ?)",
+        (cache_key, json.dumps(result), output_path, os.path.getsize(output_path), time.time())
+    )
+
+    rows = jobs_db_fetch("SELECT key, result, output_path, size FROM result_cache ORDER BY last_used DESC")
+    total_size = 0
+    for row in rows:
+        total_size += row["size"]
+        if total_size > app.config["RESULT_CACHE_MAX_BYTES"] and row["key"] != cache_key:
+            jobs_db_execute("DELETE FROM result_cache WHERE key = ?", (row["key"],))
+            for path in [row["output_path"]] + json.loads(row["result"]).get("subtitle_paths", []):
+                if os.path.exists(path):
+                    os.remove(path)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def start_job_workers():
+    """Starts the worker threads once per process and picks up jobs left in the queue."""
+    with _job_workers_lock:
+        if _job_workers:
+            return
+
+        # Register this process under its PID, replacing an earlier process that had the same PID
+        jobs_db_execute("INSERT OR REPLACE INTO job_workers (pid, token) VALUES (?, ?)", (os.getpid(), WORKER_TOKEN))
+
+        # Jobs owned by a process that no longer exists are run again
+        rows = jobs_db_fetch("""
+            SELECT jobs.id, jobs.worker_pid, jobs.worker_token, job_workers.token AS live_token
+            FROM jobs LEFT JOIN job_workers ON job_workers.pid = jobs.worker_pid
+            WHERE jobs.status = 'running'
+        """)
+        for row in rows:
+            if (row["worker_token"] is None or row["worker_token"] != row["live_token"]
+                    or not _pid_alive(row["worker_pid"])):
+                jobs_db_execute(
+                    "UPDATE jobs SET status = 'queued', worker_pid = NULL, worker_token = NULL, updated_at = ? "
+                    "WHERE id = ?",
+                    (time.time(), row["id"])
+                )
+
+        for row in jobs_db_fetch("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"):
+            _pending_job_ids.put(row["id"])
+
+        for _ in range(app.config["MAX_CONCURRENT_JOBS"]):
+            worker = threading.Thread(target=job_worker, daemon=True)
+            worker.start()
+            _job_workers.append(worker)
+
+def enqueue_job(params, cache_key=None):
+    """Stores a new job in the queue and returns its ID.
+
+    If a job with the same cache_key is already queued or running, the new
+    job is attached to it instead: it gets its own ID (and can be cancelled
+    on its own) but follows the shared job, so identical requests are
+    computed once.
+    """
+    start_job_workers()
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    try:
+        jobs_db_execute(
+            "INSERT INTO jobs (id, status, params, cache_key, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, json.dumps(params), cache_key, now, now)
+        )
+    except sqlite3.IntegrityError:
+        rows = jobs_db_fetch(
+            "SELECT id FROM jobs WHERE cache_key = ? AND status IN ('queued', 'running') AND cancel_requested = 0",
+            (cache_key,)
+        )
+        # Only attach while the shared job is live; if it finished or is being cancelled, start over
+        if rows and jobs_db_execute(
+            "UPDATE jobs SET refs = refs + 1 WHERE id = ? AND status IN ('queued', 'running') AND cancel_requested = 0",
+            (rows[0]["id"],)
+        ):
+            jobs_db_execute(
+                "INSERT INTO jobs (id, status, params, shared_job_id, created_at, updated_at) "
+                "VALUES (?, 'attached', ?, ?, ?, ?)",
+                (job_id, json.dumps(params), rows[0]["id"], now, now)
+            )
+            return job_id
+        return enqueue_job(params, cache_key)
+
+    _pending_job_ids.put(job_id)
+    return job_id
+
+def record_cached_job(params, cache_key, result):
+    """Stores an already completed job for a cache hit and returns its ID."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    jobs_db_execute(
+        "INSERT INTO jobs (id, status, params, result, cache_key, created_at, updated_at) "
+        "VALUES (?, 'completed', ?, ?, ?, ?, ?)",
+        (job_id, json.dumps(params), json.dumps(result), cache_key, now, now)
+    )
+    return job_id
+
+def get_job(job_id):
+    """Returns the job row for job_id, or None."""
+    rows = jobs_db_fetch("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    return rows[0] if rows else None
+
+def get_job_view(job_id):
+    """Returns a job as its client sees it, or None.
+
+    An attached job reports the status, progress and result of the shared
+    job it follows; a job whose client cancelled it reports "cancelled" even
+    while the shared work goes on for other requests.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    view = dict(get_job(job["shared_job_id"]) if job["shared_job_id"] else job)
+    view.update(id=job["id"], params=job["params"], created_at=job["created_at"])
+    if job["detached"]:
+        view.update(status="cancelled", result=None, updated_at=job["updated_at"])
+    return view
+
+def cancel_job_request(job_id):
+    """Cancels one client's job and returns its new status, or None if it was no longer queued or running.
+
+    The shared work is only cancelled once every job sharing it has been:
+    "cancelled" if it hadn't started, "cancelling" if it stops at its next
+    progress update. While other jobs still share it, it keeps running.
+    """
+    job = get_job(job_id)
+    shared_job_id = job["shared_job_id"] or job_id
+    if get_job_view(job_id)["status"] not in ("queued", "running"):
+        return None
 
-        return output_path
-    except Exception as e:
-        print(f"Error overlaying captions: {e}")
+    now = time.time()
+    if not jobs_db_execute(
+        "UPDATE jobs SET detached = 1, status = CASE WHEN shared_job_id IS NULL THEN status ELSE 'cancelled' END, "
+        "updated_at = ? WHERE id = ? AND detached = 0",
+        (now, job_id)
+    ):
         return None
+    jobs_db_execute("UPDATE jobs SET refs = refs - 1 WHERE id = ?", (shared_job_id,))
+
+    if jobs_db_execute(
+        "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, updated_at = ? "
+        "WHERE id = ? AND status = 'queued' AND refs <= 0",
+        (now, shared_job_id)
+    ):
+        return "cancelled"
+    if jobs_db_execute(
+        "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = 'running' AND refs <= 0",
+        (now, shared_job_id)
+    ):
+        return "cancelling"
+    return "cancelled"
+
+def make_progress_reporter(job_id):
+    """Returns a progress(stage, done, total) callback that records per-stage progress for a job.
+
+    Writes are throttled to one every JOB_PROGRESS_INTERVAL seconds per stage.
+    The callback raises JobCancelled once the job has been cancelled.
+    """
+    stages = {}
+    last_write = {"stage": None, "time": 0.0}
+
+    def report(stage, done, total):
+        stages[stage] = {"done": done, "total": total}
+        now = time.monotonic()
+        if (stage == last_write["stage"] and done != total
+                and now - last_write["time"] < JOB_PROGRESS_INTERVAL):
+            return
+        last_write["stage"] = stage
+        last_write["time"] = now
+
+        jobs_db_execute(
+            "UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?",
+            (stage, json.dumps(stages), time.time(), job_id)
+        )
+        if get_job(job_id)["cancel_requested"]:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+
+    return report
+
+def finish_job(job_id, status, result=None, error=None):
+    jobs_db_execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+        (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+    )
+
+def run_job(job_id):
+    """Runs one claimed job and records its outcome."""
+    job = get_job(job_id)
+    params = json.loads(job["params"])
+    try:
+        if "outputs" in params:
+            result = run_process_batch(params, make_progress_reporter(job_id))
+        else:
+            result = run_process_video(params, make_progress_reporter(job_id))
+    except JobCancelled:
+        finish_job(job_id, "cancelled")
+        return
+    except Exception as e:
+        # Processing stages swallow their own errors, so a cancel can surface as a failure
+        if get_job(job_id)["cancel_requested"]:
+            finish_job(job_id, "cancelled")
+        else:
+            print(f"Error processing job {job_id}: {e}")
+            finish_job(job_id, "failed", error=str(e))
+        return
+
+    job = get_job(job_id)
+    if job["cancel_requested"]:
+        finish_job(job_id, "cancelled")
+        return
+
+    # Batch outputs are cached one by one, apart from single requests since they are rendered differently
+    if "outputs" in params:
+        specs = batch_output_specs(params)
+        cached = [(batch_output_cache_key(spec), output) for spec, output in zip(specs, result["outputs"])]
+    else:
+        # Keyed again now that the job has loaded (or failed to load) the models it asked for
+        cached = [(result_cache_key(params), result)] if job["cache_key"] else []
+    for cache_key, cached_result in cached:
+        try:
+            store_cached_result(cache_key, cached_result)
+        except Exception as e:
+            print(f"Error caching result of job {job_id}: {e}")
+    finish_job(job_id, "completed", result=result)
+
+def job_worker():
+    """Claims queued jobs one at a time and runs them."""
+    while True:
+        job_id = _pending_job_ids.get()
+        claimed = jobs_db_execute(
+            "UPDATE jobs SET status = 'running', worker_pid = ?, worker_token = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (os.getpid(), WORKER_TOKEN, time.time(), job_id)
+        )
+        if claimed:
+            run_job(job_id)
+
+def download_url(path):
+    """Returns the /download URL of a file in OUTPUT_FOLDER."""
+    return url_for("download", filename=os.path.relpath(path, app.config["OUTPUT_FOLDER"]).replace(os.sep, "/"))
+
+def with_download_urls(result):
+    """Adds download URLs next to the output and subtitle paths of a job result."""
+    if not result:
+        return result
+    if "outputs" in result:
+        return dict(result, outputs=[with_download_urls(output) for output in result["outputs"]])
+    urls = {}
+    if result.get("output_path"):
+        urls["download_url"] = download_url(result["output_path"])
+    if result.get("subtitle_paths"):
+        urls["subtitle_urls"] = [download_url(path) for path in result["subtitle_paths"]]
+    return dict(result, **urls)
+
+def job_to_dict(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": json.loads(job["progress"]),
+        "result": with_download_urls(json.loads(job["result"])) if job["result"] else None,
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
 
 @app.route("/process_video", methods=["POST"])
 def process_video():
-    """Processes video based on user selection."""
+    """Queues video processing based on user selection and returns the job ID.
+
+    Results already in the cache are returned immediately as a completed job.
+    """
     data = request.json
+    if not data or not data.get("file_path"):
+        return jsonify({"error": "No file_path provided"}), 400
     try:
-        video_path = data.get("file_path")
-        format_type = data.get("format", "mp4")
-        aspect_ratio_str = data.get("aspect_ratio", "16:9")
-        auto_caption = data.get("auto_caption", False)
-        resolution_str = data.get("resolution", "100%")
-        use_face_tracking = data.get("use_face_tracking", False)
-
-        # Get original dimensions
-        cap = cv2.VideoCapture(video_path)
-        original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        cap.release()
+        parse_time_range(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid start/end: {e}"}), 400
+    if data.get("caption_mode", "burn") not in CAPTION_MODES:
+        return jsonify({"error": f"caption_mode must be one of {', '.join(CAPTION_MODES)}"}), 400
 
-        # Calculate resolution percentage
-        resolution_percentage = float(resolution_str.replace("%", "")) / 100.0
+    try:
+        cache_key = result_cache_key(data)
+        cached_result = lookup_cached_result(cache_key)
+        if cached_result:
+            job_id = record_cached_job(data, cache_key, cached_result)
+            return jsonify({"job_id": job_id, "status": "completed", "result": with_download_urls(cached_result),
+                            "cached": True})
+
+        job_id = enqueue_job(data, cache_key)
+        return jsonify({"job_id": job_id, "status": get_job_view(job_id)["status"]}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Parse aspect ratio and calculate target dimensions
-        aspect_ratio = parse_aspect_ratio(aspect_ratio_str)
-        if aspect_ratio:
-            ratio_w, ratio_h = aspect_ratio
-            target_ratio = ratio_w / ratio_h
-            new_width = int(original_width * resolution_percentage)
-            new_height = int(new_width * ratio_h / ratio_w)
-        else:
-            new_width = int(original_width * resolution_percentage)
-            new_height = int(original_height * resolution_percentage)
+@app.route("/process_video_batch", methods=["POST"])
+def process_video_batch():
+    """Queues several outputs of one video (e.g. 9:16, 1:1 and 16:9) as a single job and returns the job ID.
 
-        target_width = new_width
-        target_height = new_height
+    The body holds file_path, an "outputs" list of per-output settings
+    (aspect_ratio, resolution, format, use_face_tracking, auto_caption) and
+    optionally defaults for those settings shared by every output.
+    """
+    data = request.json
+    if not data or not data.get("file_path"):
+        return jsonify({"error": "No file_path provided"}), 400
+    try:
+        parse_time_range(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid start/end: {e}"}), 400
+    if not isinstance(data.get("outputs"), list) or not data["outputs"]:
+        return jsonify({"error": "No outputs provided"}), 400
+    if any(spec.get("caption_mode", "burn") not in CAPTION_MODES for spec in batch_output_specs(data)):
+        return jsonify({"error": f"caption_mode must be one of {', '.join(CAPTION_MODES)}"}), 400
 
-        # Generate output path
-        output_filename = f"output_{uuid.uuid4().hex}.{format_type}"
-        output_path = os.path.join(app.config["OUTPUT_FOLDER"], output_filename)
+    try:
+        job_id = enqueue_job(data)
+        return jsonify({"job_id": job_id, "status": get_job_view(job_id)["status"]}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        processed_path = None
+@app.route("/preview", methods=["POST"])
+def preview():
+    """Renders a low-resolution preview of the first seconds of a /process_video request and returns it directly."""
+    data = request.json
+    if not data or not data.get("file_path"):
+        return jsonify({"error": "No file_path provided"}), 400
+    try:
+        parse_time_range(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid start/end: {e}"}), 400
 
-        if use_face_tracking and yolo_model is not None:
-            processed_path = crop_video_to_face(
-                video_path,
-                output_path,
-                aspect_ratio_str,
-                target_width,
-                target_height
-            )
-        else:
-            processed_path = resize_video(
-                video_path,
-                output_path,
-                aspect_ratio_str,
-                resolution_percentage * 100
-            )
+    try:
+        return jsonify(with_download_urls(run_preview(data)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        if not processed_path:
-            return jsonify({"error": "Failed to process video"}), 500
+@app.route("/download/<path:filename>", methods=["GET"])
+def download(filename):
+    """Serves a processed output from OUTPUT_FOLDER.
+
+    Supports Range requests (so players can seek), ETag / Last-Modified
+    conditional GETs and ?download=1 for an attachment. The file is passed to
+    the WSGI server's file wrapper (sendfile where the server supports it) or,
+    with USE_X_SENDFILE, to the fronting web server, so the worker never reads
+    it into memory.
+    """
+    # Downloading a cached output counts as using it for the result cache's LRU
+    path = os.path.join(app.config["OUTPUT_FOLDER"], filename)
+    jobs_db_execute("UPDATE result_cache SET last_used = ? WHERE output_path = ?", (time.time(), path))
+    # Absolute, because Flask resolves relative directories against the app's root rather than the working directory
+    return send_from_directory(os.path.abspath(app.config["OUTPUT_FOLDER"]), filename, conditional=True, etag=True,
+                               as_attachment=request.args.get("download") == "1")
+
+@app.route("/job_status/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Returns the status, per-stage progress and result of a job."""
+    job = get_job_view(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_dict(job))
+
+@app.route("/job_progress/<job_id>", methods=["GET"])
+def job_progress(job_id):
+    """Returns the current stage and frames processed / total for each stage of a job."""
+    job = get_job_view(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": json.loads(job["progress"])
+    })
 
-        result = {"output_path": processed_path}
+@app.route("/cancel_job/<job_id>", methods=["POST"])
+def cancel_job(job_id):
+    """Cancels a queued job, or asks a running job to stop at its next progress update.
 
-        # Handle captions
-        if auto_caption:
-            captions = generate_captions(video_path)
-            if captions and isinstance(captions, list):
-                captioned_path = processed_path.replace(f".{format_type}", f"_captioned.{format_type}")
-                overlay_captions(processed_path, captions, captioned_path)
-                result["output_path"] = captioned_path
+    Jobs sharing work with identical requests only detach from it; the work
+    stops once all of them are cancelled.
+    """
+    if get_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
 
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    status = cancel_job_request(job_id)
+    if status == "cancelling":
+        return jsonify({"job_id": job_id, "status": status}), 202
+    if status == "cancelled":
+        return jsonify({"job_id": job_id, "status": status})
+    return jsonify({"error": f"Job already {get_job_view(job_id)['status']}"}), 409
 
 @app.route("/available_features", methods=["GET"])
 def available_features():
-    """Returns available features status."""
+    """Returns available features status along with each model's loading status.
+
+    *_available is true once the feature's model is ready; *_status also
+    tells a model that is still loading ("loading") from one that failed
+    ("unavailable").
+    """
     return jsonify({
-        "face_tracking_available": yolo_model is not None,
-        "auto_caption_available": stt_model is not None
+        "face_tracking_available": model_available("yolo"),
+        "auto_caption_available": model_available("whisper"),
+        "face_tracking_status": feature_status("yolo"),
+        "auto_caption_status": feature_status("whisper"),
+        "models": model_status()
     })
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 once the server can accept jobs, 503 if it can't.
+
+    Models loading in the background don't hold traffic back (plain resizes
+    don't need them, and jobs that do wait for them); their status is
+    reported in the body.
+    """
+    try:
+        start_job_workers()
+        jobs_db_fetch("SELECT 1")
+    except Exception as e:
+        return jsonify({"ready": False, "error": str(e), "models": model_status()}), 503
+    return jsonify({"ready": True, "models": model_status()})
+
 if __name__ == "__main__":
     app.run(debug=True)
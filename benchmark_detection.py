@@ -0,0 +1,44 @@
+import argparse
+import time
+
+import cv2
+
+import backend
+
+# Measures YOLO detection throughput (frames/sec) for different batch sizes
+parser = argparse.ArgumentParser(description="Benchmark batched YOLO person detection.")
+parser.add_argument("video_path", help="Video to decode frames from")
+parser.add_argument("--batch-sizes", default="1,2,4,8,16,32",
+                    help="Comma-separated list of batch sizes to try")
+parser.add_argument("--max-frames", type=int, default=256,
+                    help="Number of frames to decode and run detection on")
+args = parser.parse_args()
+
+if backend.get_model("yolo") is None:
+    raise SystemExit("YOLO model not loaded, nothing to benchmark.")
+
+# Decode once up front so only inference is timed
+cap = cv2.VideoCapture(args.video_path)
+frames = []
+for frame in backend.read_frames(cap):
+    frames.append(frame)
+    if len(frames) >= args.max_frames:
+        break
+cap.release()
+
+if not frames:
+    raise SystemExit(f"No frames could be read from {args.video_path}")
+
+print(f"{len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}")
+print(f"{'batch':>6} {'frames/sec':>12} {'ms/frame':>10}")
+
+# Warm-up call so model initialisation is not counted
+backend.detect_person_boxes(frames[:1])
+
+for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+    start = time.perf_counter()
+    for batch in backend.batched(iter(frames), batch_size):
+        backend.detect_person_boxes(batch)
+    elapsed = time.perf_counter() - start
+
+    print(f"{batch_size:>6} {len(frames) / elapsed:>12.1f} {1000 * elapsed / len(frames):>10.2f}")
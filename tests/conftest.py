@@ -0,0 +1,33 @@
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+# backend creates its upload/output/cache folders and jobs.db in the working directory on import
+os.environ.setdefault("PRELOAD_MODELS", "0")
+os.environ.setdefault("UPLOAD_PREANALYSIS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_work_dir = tempfile.mkdtemp(prefix="videoresizer_tests_")
+atexit.register(shutil.rmtree, _work_dir, ignore_errors=True)
+os.chdir(_work_dir)
+
+
+@pytest.fixture(scope="session")
+def sample_video():
+    """A 2 second 320x240 test pattern with a sine tone."""
+    import backend
+
+    path = os.path.abspath("sample.mp4")
+    if not os.path.exists(path):
+        subprocess.run(
+            [backend.FFMPEG_BINARY, "-y", "-loglevel", "error",
+             "-f", "lavfi", "-i", "testsrc=size=320x240:rate=25:duration=2",
+             "-f", "lavfi", "-i", "sine=duration=2",
+             "-c:v", "libx264", "-c:a", "aac", "-shortest", path],
+            check=True
+        )
+    return path
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+import backend
+
+
+@pytest.fixture
+def running_task(monkeypatch):
+    """Starts run_once("task") on a thread that reports progress until released, then raises what it is given."""
+    monkeypatch.setattr(backend, "ANALYSIS_WAIT_INTERVAL", 0.01)
+    started = threading.Event()
+    release = threading.Event()
+    outcome = {}
+
+    def compute(progress):
+        progress("detect", 1, 10)
+        started.set()
+        release.wait(5)
+        raise outcome["error"]
+
+    def owner():
+        try:
+            backend.run_once("task", compute)
+        except BaseException as e:
+            outcome["raised"] = e
+
+    thread = threading.Thread(target=owner)
+    thread.start()
+    started.wait(5)
+
+    def finish(error):
+        outcome["error"] = error
+        release.set()
+        thread.join(5)
+        return outcome["raised"]
+
+    yield finish
+    release.set()
+    thread.join(5)
+
+
+def test_waiter_takes_over_when_the_running_job_is_cancelled(running_task):
+    result = {}
+    waiter = threading.Thread(target=lambda: result.update(value=backend.run_once("task", lambda progress: "mine")))
+    waiter.start()
+
+    assert isinstance(running_task(backend.JobCancelled("owner cancelled")), backend.JobCancelled)
+    waiter.join(5)
+    assert result == {"value": "mine"}
+
+
+def test_waiter_relays_progress_and_can_be_cancelled(running_task):
+    reports = []
+
+    def progress(stage, done, total):
+        reports.append((stage, done, total))
+        raise backend.JobCancelled("waiter cancelled")
+
+    with pytest.raises(backend.JobCancelled):
+        backend.run_once("task", lambda progress: "mine", progress)
+    assert reports == [("detect", 1, 10)]
+    running_task(RuntimeError("done"))
@@ -0,0 +1,31 @@
+import backend
+
+
+def test_batch_renders_every_container(sample_video):
+    data = {
+        "file_path": sample_video,
+        "outputs": [
+            {"aspect_ratio": "1:1", "resolution": "50%", "format": "mp4"},
+            {"aspect_ratio": "9:16", "resolution": "50%", "format": "webm"},
+        ],
+    }
+
+    outputs = backend.run_process_batch(data)["outputs"]
+
+    codecs = [(probe["video_codec"], probe["audio_codec"])
+              for probe in (backend.probe_video(output["output_path"]) for output in outputs)]
+    assert codecs == [("h264", "aac"), ("vp9", "opus")]
+
+
+def test_python_resize_writes_webm(sample_video):
+    output_path = backend.resize_video(sample_video, "resized.webm", "1:1", 50, engine="python")
+
+    probe = backend.probe_video(output_path)
+    assert (probe["video_codec"], probe["audio_codec"]) == ("vp9", "opus")
+
+
+def test_batch_outputs_are_not_served_to_single_requests(sample_video):
+    spec = {"file_path": sample_video, "aspect_ratio": "4:5", "engine": "ffmpeg"}
+
+    assert backend.batch_output_cache_key(spec) != backend.result_cache_key(spec)
+    assert backend.batch_output_cache_key(spec) == backend.batch_output_cache_key(dict(spec, engine="python"))
@@ -0,0 +1,42 @@
+import threading
+import time
+
+import numpy as np
+
+import backend
+
+
+def fake_yolo(frames, **kwargs):
+    return [f"result {frame[0, 0, 0]}" for frame in frames]
+
+
+def frames(*values):
+    return [np.full((4, 4, 3), value, dtype=np.uint8) for value in values]
+
+
+def test_lone_caller_skips_batching_deadline(monkeypatch):
+    monkeypatch.setattr(backend, "get_model", lambda name: fake_yolo)
+    monkeypatch.setitem(backend.app.config, "INFERENCE_MAX_LATENCY_MS", 2000)
+
+    start = time.monotonic()
+    results = [backend.run_yolo(frames(i)) for i in range(5)]
+
+    assert time.monotonic() - start < 1
+    assert results == [[f"result {i}"] for i in range(5)]
+
+
+def test_concurrent_callers_get_their_own_results(monkeypatch):
+    monkeypatch.setattr(backend, "get_model", lambda name: fake_yolo)
+    monkeypatch.setitem(backend.app.config, "INFERENCE_MAX_LATENCY_MS", 50)
+    results = {}
+
+    def call(i):
+        results[i] = backend.run_yolo(frames(i, i))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: [f"result {i}"] * 2 for i in range(8)}
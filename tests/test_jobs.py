@@ -0,0 +1,102 @@
+import os
+import queue
+import uuid
+
+import pytest
+
+import backend
+
+
+@pytest.fixture
+def queue_only(monkeypatch):
+    """Jobs are stored but no worker picks them up."""
+    monkeypatch.setattr(backend, "start_job_workers", lambda: None)
+    monkeypatch.setattr(backend, "_pending_job_ids", queue.Queue())
+    return uuid.uuid4().hex
+
+
+def status(job_id):
+    return backend.get_job_view(job_id)["status"]
+
+
+def test_identical_requests_get_their_own_ids(queue_only):
+    first = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+    second = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+
+    assert first != second
+    assert backend.get_job(second)["shared_job_id"] == first
+    assert status(first) == status(second) == "queued"
+
+
+def test_cancelling_one_request_keeps_the_shared_job(queue_only):
+    first = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+    second = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+
+    assert backend.cancel_job_request(first) == "cancelled"
+    assert status(first) == "cancelled"
+    assert status(second) == "queued"
+    assert not backend.get_job(first)["cancel_requested"]
+
+    assert backend.cancel_job_request(second) == "cancelled"
+    assert backend.get_job(first)["cancel_requested"]
+    assert backend.cancel_job_request(second) is None
+
+
+def test_running_shared_job_stops_after_its_last_request(queue_only):
+    first = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+    backend.jobs_db_execute("UPDATE jobs SET status = 'running' WHERE id = ?", (first,))
+    second = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+
+    client = backend.app.test_client()
+    assert client.post(f"/cancel_job/{second}").json["status"] == "cancelled"
+    assert status(first) == "running"
+    response = client.post(f"/cancel_job/{first}")
+    assert (response.status_code, response.json["status"]) == (202, "cancelling")
+
+
+def test_cancelled_shared_job_does_not_absorb_new_requests(queue_only):
+    first = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+    backend.jobs_db_execute("UPDATE jobs SET status = 'running' WHERE id = ?", (first,))
+    backend.cancel_job_request(first)
+
+    second = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+    assert backend.get_job(second)["shared_job_id"] is None
+    assert status(second) == "queued"
+
+
+def test_cache_key_covers_render_settings(sample_video):
+    request = {"file_path": sample_video, "aspect_ratio": "9:16"}
+    keys = {
+        backend.result_cache_key(request),
+        backend.result_cache_key(dict(request, engine="python")),
+        backend.result_cache_key(dict(request, parallel=True)),
+    }
+    assert len(keys) == 3
+
+
+def test_jobs_of_a_previous_process_with_the_same_pid_are_requeued(queue_only, monkeypatch):
+    job_id = backend.enqueue_job({"file_path": "a.mp4"}, queue_only)
+    backend.jobs_db_execute(
+        "UPDATE jobs SET status = 'running', worker_pid = ?, worker_token = 'previous' WHERE id = ?",
+        (os.getpid(), job_id)
+    )
+
+    monkeypatch.undo()
+    monkeypatch.setattr(backend, "_pending_job_ids", queue.Queue())
+    monkeypatch.setattr(backend, "_job_workers", [])
+    monkeypatch.setitem(backend.app.config, "MAX_CONCURRENT_JOBS", 0)
+    backend.start_job_workers()
+
+    assert status(job_id) == "queued"
+    assert job_id in backend._pending_job_ids.queue
+
+
+def test_uploads_are_keyed_on_their_stored_hash_without_reading_them():
+    content_hash = "ab" * 32
+    path = backend.stored_upload_path(content_hash, "mp4")
+    with open(path, "wb") as f:
+        f.write(b"not what the name says")
+    try:
+        assert backend.file_content_hash(path) == content_hash
+    finally:
+        os.remove(path)
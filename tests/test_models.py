@@ -0,0 +1,24 @@
+import pytest
+
+import backend
+
+
+@pytest.fixture
+def models_loading(monkeypatch):
+    monkeypatch.setitem(backend._model_status, "yolo", {"status": "loading", "error": None})
+    monkeypatch.setitem(backend._model_status, "whisper", {"status": "failed", "error": "no weights"})
+
+
+def test_ready_while_models_load(models_loading):
+    response = backend.app.test_client().get("/ready")
+
+    assert response.status_code == 200
+    assert response.json["models"]["yolo"]["status"] == "loading"
+
+
+def test_features_report_loading_separately(models_loading):
+    features = backend.app.test_client().get("/available_features").json
+
+    assert features["face_tracking_available"] is False
+    assert features["face_tracking_status"] == "loading"
+    assert features["auto_caption_status"] == "unavailable"
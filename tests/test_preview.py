@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+import backend
+
+
+def test_previews_are_cached_and_keyed_on_preview_settings(sample_video, monkeypatch):
+    data = {"file_path": sample_video, "aspect_ratio": "1:1"}
+
+    first = backend.run_preview(data)
+    assert backend.run_preview(data) == first
+    assert backend.lookup_cached_result(backend.preview_cache_key(data)) == first
+
+    monkeypatch.setitem(backend.app.config, "PREVIEW_MAX_SIZE", 120)
+    smaller = backend.run_preview(data)
+    assert smaller["output_path"] != first["output_path"]
+    assert backend.probe_video(smaller["output_path"])["width"] == 120
+
+
+def test_previews_count_toward_the_cache_limit(sample_video, monkeypatch):
+    monkeypatch.setitem(backend.app.config, "RESULT_CACHE_MAX_BYTES", 1)
+    old = backend.run_preview({"file_path": sample_video, "aspect_ratio": "4:3"})
+    backend.run_preview({"file_path": sample_video, "aspect_ratio": "3:4"})
+
+    assert not os.path.exists(old["output_path"])
+
+
+def test_static_crop_path_renders(sample_video, tmp_path):
+    crop_path = np.tile([0, 0, 240, 240], (50, 1))
+    path_file = backend.save_crop_path(str(tmp_path / "crop.csv"), crop_path)
+
+    output_path = backend.render_crop_path(sample_video, str(tmp_path / "static.mp4"), path_file, 120, 120, 25)
+
+    assert backend.probe_video(output_path)["width"] == 120
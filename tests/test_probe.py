@@ -0,0 +1,67 @@
+import subprocess
+from fractions import Fraction
+
+import pytest
+
+import backend
+
+
+@pytest.fixture(scope="module")
+def make_video(tmp_path_factory):
+    """Encodes a 2 second test pattern with the given ffmpeg input and output options."""
+    folder = tmp_path_factory.mktemp("probe")
+
+    def make(name, rate="25", input_options=(), output_options=(), audio=True):
+        path = str(folder / name)
+        cmd = [backend.FFMPEG_BINARY, "-y", "-loglevel", "error",
+               "-f", "lavfi", "-i", f"testsrc=size=320x240:rate={rate}:duration=2"]
+        if audio:
+            cmd += ["-f", "lavfi", "-i", "sine=duration=2", "-c:a", "aac"]
+        subprocess.run(cmd + ["-c:v", "libx264", "-pix_fmt", "yuv420p", *output_options, "-shortest", path],
+                       check=True)
+        if input_options:
+            rotated = str(folder / f"rotated_{name}")
+            subprocess.run([backend.FFMPEG_BINARY, "-y", "-loglevel", "error", *input_options, "-i", path,
+                            "-c", "copy", rotated], check=True)
+            path = rotated
+        return path
+
+    return make
+
+
+def test_ntsc_frame_rate_is_exact(make_video):
+    path = make_video("ntsc.mp4", rate="30000/1001")
+    probe = backend.probe_video(path)
+
+    assert probe["fps"] == Fraction(30000, 1001)
+    cap = backend.cv2.VideoCapture(path)
+    assert probe["frame_count"] == sum(1 for _ in backend.read_frames(cap))
+    cap.release()
+    assert probe["duration"] == pytest.approx(2, abs=0.05)
+
+
+def test_rotated_video_reports_displayed_size(make_video):
+    path = make_video("rotated.mp4", input_options=["-display_rotation", "90"])
+    probe = backend.probe_video(path)
+
+    assert (probe["width"], probe["height"], probe["rotation"]) == (240, 320, 90)
+    backend._media_probes.clear()
+    assert backend.video_dimensions(path) == (240, 320)
+
+
+def test_keyframes_are_in_presentation_order(make_video):
+    # With open GOPs, B-frames shown before each I-frame are stored after it
+    path = make_video("bframes.mp4", output_options=["-bf", "3", "-g", "10", "-keyint_min", "10",
+                                                     "-sc_threshold", "0", "-x264-params", "open-gop=1"])
+    probe = backend.probe_video(path)
+
+    assert probe["frame_count"] == 50
+    assert probe["keyframes"] == [0, 10, 20, 30, 40]
+
+
+def test_video_without_audio(make_video):
+    path = make_video("silent.mp4", audio=False)
+    probe = backend.probe_video(path)
+
+    assert (probe["video_codec"], probe["audio_codec"]) == ("h264", None)
+    assert backend.extract_audio(path) is None
@@ -0,0 +1,54 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import backend
+
+# sample_video is 50 frames at 25 fps; box i is at x = i so slices are easy to recognise
+FRAMES = 50
+
+
+@pytest.fixture
+def analysed_video(sample_video):
+    """sample_video with a cached detection index, scene cuts and transcript."""
+    boxes = np.array([[i, 0, i + 100, 200] for i in range(FRAMES)], dtype=np.float32)
+    paths = [
+        backend.save_detection_index(sample_video, boxes, np.ones(FRAMES), np.arange(FRAMES) % 8 == 0, (320, 240), 8),
+        backend.save_json(backend.scene_cuts_path(sample_video), [10, 30]),
+        backend.save_json(backend.video_transcript_cache_path(sample_video), [
+            {"start": 0.0, "end": 0.6, "text": "before"},
+            {"start": 0.8, "end": 1.2, "text": "across the start"},
+            {"start": 1.8, "end": 2.0, "text": "after"},
+        ]),
+    ]
+    yield sample_video
+    for path in paths:
+        os.remove(path)
+
+
+def test_clip_reuses_the_source_analysis(analysed_video):
+    clip_path = backend.extract_clip(analysed_video, 1.0, 1.8)
+    try:
+        index = backend.load_detection_index(clip_path)
+        assert index["boxes"][:, 0].tolist() == list(range(25, 45))
+        assert backend.detect_scene_cuts(clip_path) == [5]
+        with open(backend.video_transcript_cache_path(clip_path)) as f:
+            assert json.load(f) == [{"start": 0, "end": pytest.approx(0.2), "text": "across the start"}]
+    finally:
+        os.remove(clip_path)
+
+
+def test_time_range_job_does_not_detect_again(analysed_video, monkeypatch):
+    def detect_person_boxes(frames):
+        raise AssertionError("the clip was analysed again")
+
+    monkeypatch.setattr(backend, "get_model", lambda name: object())
+    monkeypatch.setattr(backend, "detect_person_boxes", detect_person_boxes)
+
+    result = backend.run_process_video({
+        "file_path": analysed_video, "aspect_ratio": "1:1", "use_face_tracking": True, "start": 1.0, "end": 1.8
+    })
+
+    assert backend.probe_video(result["output_path"])["frame_count"] == 20
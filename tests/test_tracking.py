@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import backend
+
+DETECTED_BOX = np.array([200, 50, 300, 250], dtype=np.float32)
+
+
+@pytest.fixture
+def drifting_tracker(monkeypatch):
+    """Detector that always finds DETECTED_BOX and a tracker that drifts 1 px right on every frame."""
+    calls = []
+
+    def detect_person_boxes(frames):
+        calls.append(len(frames))
+        return [DETECTED_BOX.copy() for _ in frames], [0.9 for _ in frames]
+
+    def track_box(prev_gray, gray, box):
+        return box + np.array([1, 0, 1, 0], dtype=np.float32), 1.0
+
+    monkeypatch.setattr(backend, "detect_person_boxes", detect_person_boxes)
+    monkeypatch.setattr(backend, "track_box", track_box)
+    return calls
+
+
+def track(frame_count, detect_interval, cuts):
+    frames = (np.zeros((36, 64, 3), dtype=np.uint8) for _ in range(frame_count))
+    return list(backend.track_person_boxes(frames, detect_interval, 8, cuts=cuts))
+
+
+@pytest.mark.parametrize("cuts", [None, [], [0], [0, 401]])
+def test_long_shot_is_redetected_every_interval(drifting_tracker, cuts):
+    results = track(1000, 8, cuts)
+
+    drift = max(abs(box - DETECTED_BOX).max() for _, box, _, _ in results)
+    assert drift <= 7
+    assert sum(drifting_tracker) >= 1000 // 8
+
+
+def test_cut_restarts_the_interval(drifting_tracker):
+    results = track(100, 8, [0, 43])
+
+    detected = [i for i, (_, _, _, was_detected) in enumerate(results) if was_detected]
+    assert detected == list(range(0, 43, 8)) + list(range(43, 100, 8))
+
+
+def test_detection_index_is_keyed_on_the_analysis_settings(sample_video, monkeypatch):
+    default = backend.detection_index_path(sample_video)
+    assert backend.detection_index_path(sample_video, 4) != default
+
+    monkeypatch.setitem(backend.app.config, "ANALYSIS_WIDTH", 320)
+    assert backend.detection_index_path(sample_video) != default
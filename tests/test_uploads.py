@@ -0,0 +1,53 @@
+import os
+import time
+
+import pytest
+
+import backend
+
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+
+def start_upload(client, size):
+    response = client.post("/uploads", json={"filename": "clip.mp4", "size": size})
+    assert response.status_code == 201
+    return response.get_json()["upload_id"]
+
+
+def put_chunk(client, upload_id, data, content_range):
+    return client.put(f"/uploads/{upload_id}", data=data, headers={"Content-Range": content_range})
+
+
+def test_chunks_must_match_their_content_range(client):
+    upload_id = start_upload(client, 10)
+
+    assert put_chunk(client, upload_id, b"abcd", "bytes 0-3/12").status_code == 416
+    assert put_chunk(client, upload_id, b"abcd", "bytes 0-11/10").status_code == 416
+    assert put_chunk(client, upload_id, b"abcd", "bytes 3-0/10").status_code == 400
+    assert put_chunk(client, upload_id, b"abcd", "bytes 0-4/10").status_code == 400
+    assert client.get(f"/uploads/{upload_id}").get_json()["offset"] == 0
+
+    assert put_chunk(client, upload_id, b"abcd", "bytes 0-3/10").get_json()["offset"] == 4
+    response = put_chunk(client, upload_id, b"efghij", "bytes 4-9/*")
+    assert response.status_code == 200
+    assert open(response.get_json()["file_path"], "rb").read() == b"abcdefghij"
+
+
+def test_stale_upload_sessions_are_deleted(client, monkeypatch):
+    stale_id = start_upload(client, 10)
+    fresh_id = start_upload(client, 10)
+    stale_paths = backend.upload_session_paths(stale_id)
+    an_hour_ago = time.time() - 3600
+    for path in stale_paths:
+        os.utime(path, (an_hour_ago, an_hour_ago))
+
+    monkeypatch.setitem(backend.app.config, "UPLOAD_SESSION_TTL", 600)
+    monkeypatch.setattr(backend, "_last_upload_cleanup", 0.0)
+    backend.cleanup_stale_uploads()
+
+    assert not any(os.path.exists(path) for path in stale_paths)
+    assert client.get(f"/uploads/{stale_id}").status_code == 404
+    assert client.get(f"/uploads/{fresh_id}").status_code == 200